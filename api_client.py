@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Groq client with a pre-warmed, kept-alive connection pool.
+
+The first request on a new connection pays for DNS, TCP and TLS setup, and
+the Groq SDK's HTTP client closes connections after 5 idle seconds, so the
+first transcription after startup or after a lull was noticeably slower than
+the rest. create_client() keeps idle connections for
+GROQ_KEEPALIVE_EXPIRY_SECONDS instead, and start_warm_pool() opens
+GROQ_WARM_CONNECTIONS connections at startup with a lightweight request
+(listing the models), then repeats it every GROQ_KEEPALIVE_SECONDS so that
+servers and proxies do not drop them while idle. A connection that was
+dropped anyway is replaced by the next ping.
+
+Warm-up requests use a short timeout and no retries, so an unreachable API
+costs at most GROQ_WARM_TIMEOUT_SECONDS, and their messages go to stderr,
+which keeps stdout free for the MCP server's stdio transport.
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import httpx
+from groq import DefaultHttpxClient, Groq
+from scheduler import MAX_CONCURRENT
+
+# Connections opened at startup and kept warm (one per concurrent transcription by default)
+WARM_CONNECTIONS = int(os.getenv("GROQ_WARM_CONNECTIONS", str(MAX_CONCURRENT)))
+
+# Pause between keep-alive pings; below the idle timeout of typical load balancers
+KEEPALIVE_SECONDS = float(os.getenv("GROQ_KEEPALIVE_SECONDS", "30"))
+
+# Idle connections are closed by the client after this long
+KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("GROQ_KEEPALIVE_EXPIRY_SECONDS", "300"))
+
+# Timeout of each warm-up or keep-alive request
+WARM_TIMEOUT_SECONDS = float(os.getenv("GROQ_WARM_TIMEOUT_SECONDS", "5"))
+
+
+def create_client(**kwargs) -> Groq:
+    """Groq client whose idle connections stay open for KEEPALIVE_EXPIRY_SECONDS"""
+    limits = httpx.Limits(
+        max_connections=100,
+        max_keepalive_connections=max(20, WARM_CONNECTIONS),
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+    )
+    return Groq(http_client=DefaultHttpxClient(limits=limits), **kwargs)
+
+
+def warm_connections(client: Groq, count: int = WARM_CONNECTIONS) -> List[Optional[float]]:
+    """
+    Open or refresh `count` pooled connections with concurrent lightweight requests
+
+    Returns:
+        Latency in seconds of each request, None for requests that failed
+    """
+    if count <= 0:
+        return []
+    # Shares the connection pool of `client`; a failed ping is simply retried by the next one
+    client = client.with_options(timeout=WARM_TIMEOUT_SECONDS, max_retries=0)
+    # Requests that overlap each take their own connection from the pool
+    barrier = threading.Barrier(count)
+
+    def ping(_):
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        started = time.perf_counter()
+        try:
+            client.models.list()
+        except Exception as e:
+            print(f"⚠️  Could not warm an API connection: {e}", file=sys.stderr)
+            return None
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(ping, range(count)))
+
+
+def keep_warm(client: Groq, count: int, stop: threading.Event, interval: float = KEEPALIVE_SECONDS) -> None:
+    """Ping the pooled connections every `interval` seconds until stop is set"""
+    while not stop.wait(interval):
+        warm_connections(client, count)
+
+
+def start_warm_pool(client: Groq, count: int = WARM_CONNECTIONS,
+                    interval: float = KEEPALIVE_SECONDS, wait: bool = True) -> threading.Event:
+    """
+    Warm `count` connections and keep them warm from a background thread
+
+    Args:
+        wait: Warm the connections before returning; otherwise the background
+            thread does it, so startup does not wait for the API
+
+    Returns:
+        Event that stops the keep-alive thread when set
+    """
+    stop = threading.Event()
+    if count <= 0:
+        return stop
+
+    def warm_up():
+        started = time.perf_counter()
+        latencies = warm_connections(client, count)
+        warmed = sum(1 for latency in latencies if latency is not None)
+        print(f"🔥 Warmed {warmed}/{count} API connections in {(time.perf_counter() - started) * 1000:.0f} ms",
+              file=sys.stderr)
+
+    def run():
+        if not wait:
+            warm_up()
+        if interval > 0:
+            keep_warm(client, count, stop, interval)
+
+    if wait:
+        warm_up()
+    if not wait or interval > 0:
+        threading.Thread(target=run, daemon=True).start()
+    return stop
@@ -1,8 +1,17 @@
 import os
 import json
+import html
+from urllib.parse import quote
 import gradio as gr
-from groq import Groq
 from dotenv import load_dotenv
+from api_client import create_client, start_warm_pool
+from audio_probe import preflight_audio
+from chunked_transcription import max_input_bytes
+from job_queue import JOB_QUEUE_ENABLED, run_transcription
+from profiling import profile_request
+from scheduler import current_client
+from waveform import load_peaks, peaks_svg
+from wire_format import format_timestamp
 
 # Load environment variables
 load_dotenv()
@@ -10,26 +19,80 @@ load_dotenv()
 # Initialize the Groq client
 client = None
 
-def transcribe_audio(audio_file):
+# Transcript rows sent to the browser at a time
+TRANSCRIPT_PAGE_SIZE = 50
+
+# Seeks the player below the waveform; runs in the browser
+SEEK_JS = """
+(seconds) => {
+    const player = document.querySelector('#waveform-player audio');
+    if (player && seconds !== null && seconds !== undefined) {
+        player.currentTime = seconds;
+        player.play();
+    }
+    return [];
+}
+"""
+
+def render_player(audio_file):
+    """
+    Waveform and player for an audio file, drawn from cached peaks instead of
+    letting the browser decode the whole file
+    """
+    if audio_file is None:
+        return ""
+    try:
+        svg = peaks_svg(load_peaks(audio_file))
+    except Exception as e:
+        print(e)
+        svg = ""
+    source = "/gradio_api/file=" + quote(os.path.abspath(audio_file))
+    # Clicking the waveform seeks to that point; inline handlers keep working without custom JS files
+    return f"""
+    <div id="waveform-player">
+        <div style="cursor: pointer" onclick="const a = this.nextElementSibling; if (a.duration) {{ a.currentTime = event.offsetX / this.clientWidth * a.duration; }}">{svg}</div>
+        <audio controls preload="metadata" src="{html.escape(source)}" style="width: 100%"></audio>
+    </div>
+    """
+
+def transcript_page(segments, page):
+    """Rows of one transcript page, the clamped page number and its label"""
+    pages = max(1, -(-len(segments or []) // TRANSCRIPT_PAGE_SIZE))
+    page = min(max(int(page or 0), 0), pages - 1)
+    first = page * TRANSCRIPT_PAGE_SIZE
+    rows = [
+        [format_timestamp(start), format_timestamp(end), text]
+        for start, end, text in (segments or [])[first:first + TRANSCRIPT_PAGE_SIZE]
+    ]
+    return rows, page, f"Page {page + 1} of {pages} ({len(segments or [])} segments)"
+
+def transcribe_audio(audio_file, language="en", prompt=None):
     """
     Transcribe an uploaded audio file using Groq's Whisper model
+
+    Retrying with another language or prompt only re-sends the parts of the
+    audio that earlier runs transcribed with low confidence
+
+    Returns the summary, the formatted TXT path, the download button update, the
+    segments kept server-side for paging, and the first transcript page
     """
     if audio_file is None:
-        return "Please upload an audio file first.", None, gr.update(visible=False)
+        return "Please upload an audio file first.", None, gr.update(visible=False), [], 0, [], ""
     
     try:
-        # Open the audio file in binary mode
-        with open(audio_file, "rb") as file:
-            # Create a transcription of the audio file
-            transcription = client.audio.transcriptions.create(
-                file=file,  # Required audio file
-                model="whisper-large-v3-turbo",  # Required model to use for transcription
-                prompt="Specify context or spelling",  # Optional
-                response_format="verbose_json",  # Optional
-                timestamp_granularities=["word", "segment"],  # Optional
-                language="en",  # Optional
-                temperature=0.0  # Optional
-            )
+        # Reject unsupported or oversized files before uploading them
+        probe = preflight_audio(audio_file, max_bytes=max_input_bytes())
+        
+        # Create a transcription of the audio file, in checkpointed chunks when it is long
+        # (run by the worker processes when the job queue is enabled)
+        transcription = run_transcription(
+            client,
+            audio_file,
+            model="whisper-large-v3-turbo",  # Required model to use for transcription
+            prompt=prompt or None,  # Optional
+            language=language or None,  # Optional, auto-detected when empty
+            probe=probe
+        )
         
         # Save transcription to file
         os.makedirs("transcripts", exist_ok=True)
@@ -38,47 +101,44 @@ def transcribe_audio(audio_file):
         
         # Save JSON data
         with open(f"transcripts/{base_name}.json", "w") as f:
-            json.dump(transcription.to_dict(), f, indent=2, default=str)
-        
-        # Format transcription with timestamps
-        formatted_output = []
-        
-        # Add header information
-        formatted_output.append(f"Language: {transcription.language}")
-        formatted_output.append(f"Duration: {transcription.duration:.2f} seconds")
-        formatted_output.append(f"Total segments: {len(transcription.segments) if hasattr(transcription, 'segments') else 0}")
-        formatted_output.append("")
-        formatted_output.append("TRANSCRIPTION WITH TIMESTAMPS:")
-        formatted_output.append("=" * 40)
-        
-        # Add segments with timestamps
-        if hasattr(transcription, 'segments') and transcription.segments:
-            for i, segment in enumerate(transcription.segments):
-                start_time = segment["start"]
-                end_time = segment["end"]
-                text = segment["text"].strip()
-                
-                # Format timestamp as MM:SS
-                start_formatted = f"{int(start_time//60):02d}:{start_time%60:05.2f}"
-                end_formatted = f"{int(end_time//60):02d}:{end_time%60:05.2f}"
-                
-                formatted_output.append(f"[{start_formatted} - {end_formatted}] {text}")
-        else:
-            # Fallback to full text if no segments
-            formatted_output.append(f"[00:00.00] {transcription.text}")
+            json.dump(transcription, f, indent=2, default=str)
         
-        formatted_text = "\n".join(formatted_output)
+        # Header information shown above the transcript
+        summary = [
+            f"Language: {transcription['language']}",
+            f"Format: {probe['format']} ({probe['codec']})",
+            f"Duration: {transcription['duration']:.2f} seconds",
+            f"Total segments: {len(transcription['segments'])}",
+        ]
+        chunks = transcription.get("chunks")
+        if chunks and chunks["reused"]:
+            summary.append(f"Reused: {chunks['reused']} of {chunks['total']} chunks "
+                           f"({chunks['reused_other_params']} from other language or prompt settings)")
+        
+        # Segments are paged to the browser; fall back to the full text if there are none
+        if transcription['segments']:
+            segments = [
+                (segment["start"], segment["end"], segment["text"].strip())
+                for segment in transcription['segments']
+            ]
+        else:
+            segments = [(0.0, transcription['duration'] or 0.0, transcription['text'])]
         
         # Save formatted transcription as TXT
+        formatted_output = summary + ["", "TRANSCRIPTION WITH TIMESTAMPS:", "=" * 40]
+        formatted_output.extend(
+            f"[{format_timestamp(start)} - {format_timestamp(end)}] {text}" for start, end, text in segments
+        )
         txt_filename = f"transcripts/{base_name}_formatted.txt"
         with open(txt_filename, "w", encoding="utf-8") as f:
-            f.write(formatted_text)
+            f.write("\n".join(formatted_output))
         
-        return formatted_text, txt_filename, gr.update(visible=True)
+        rows, page, label = transcript_page(segments, 0)
+        return "\n".join(summary), txt_filename, gr.update(visible=True), segments, page, rows, label
         
     except Exception as e:
         print(e)
-        return f"Error transcribing audio: {str(e)}", None, gr.update(visible=False)
+        return f"Error transcribing audio: {str(e)}", None, gr.update(visible=False), [], 0, [], ""
 
 def download_transcription(txt_filename):
     """Return the transcription file for download"""
@@ -89,20 +149,41 @@ def download_transcription(txt_filename):
 # Create the Gradio interface
 def create_interface(api_key=None):
     global client
-    client = Groq(api_key=api_key)
+    client = create_client(api_key=api_key)
     with gr.Blocks(title="Groq Audio Transcription", theme=gr.themes.Soft()) as demo:
         gr.Markdown("# 🎵 Groq Audio Transcription")
         gr.Markdown("Upload an audio file to transcribe it using Groq's Whisper model.")
         
         with gr.Row():
             with gr.Column(scale=1):
-                audio_input = gr.Audio(
+                # A file input instead of gr.Audio: the browser would decode and draw
+                # the whole waveform of multi-hour uploads
+                audio_input = gr.File(
                     label="Upload Audio File",
+                    file_types=["audio"],
+                    type="filepath"
+                )
+                
+                mic_input = gr.Audio(
+                    label="Or Record",
                     type="filepath",
-                    sources=["upload", "microphone"]
+                    sources=["microphone"]
                 )
                 
-        
+                with gr.Row():
+                    language_input = gr.Textbox(
+                        label="Language",
+                        value="en",
+                        placeholder="Auto-detect",
+                        max_lines=1,
+                        scale=1
+                    )
+                    prompt_input = gr.Textbox(
+                        label="Prompt",
+                        placeholder="Specify context or spelling",
+                        max_lines=1,
+                        scale=3
+                    )
                 
                 transcribe_btn = gr.Button(
                     "🎤 Transcribe Audio",
@@ -111,13 +192,28 @@ def create_interface(api_key=None):
                 )
             
             with gr.Column(scale=2):
+                player = gr.HTML()
+                
                 output_text = gr.Textbox(
                     label="Transcription Results",
                     placeholder="Transcription will appear here...",
-                    lines=15,
-                    max_lines=20
+                    lines=5,
+                    max_lines=5
                 )
                 
+                transcript_table = gr.Dataframe(
+                    headers=["Start", "End", "Text"],
+                    datatype=["str", "str", "str"],
+                    interactive=False,
+                    wrap=True,
+                    max_height=500
+                )
+                
+                with gr.Row():
+                    prev_btn = gr.Button("◀ Previous", size="sm")
+                    page_label = gr.Markdown()
+                    next_btn = gr.Button("Next ▶", size="sm")
+                
                 download_btn = gr.Button(
                     "📥 Download Formatted Transcription",
                     visible=False,
@@ -128,15 +224,18 @@ def create_interface(api_key=None):
         with gr.Accordion("ℹ️ Information", open=False):
             gr.Markdown("""
             **Supported Audio Formats:**
-            - MP3, MP4, M4A, MPEG, MPGA, M4B, WAV, WEBM
+            - MP3, MP4, M4A, MPEG, MPGA, M4B, WAV, WEBM, OGG, FLAC
+            - Files are checked locally before upload (format and size limit)
+            - Long recordings are split into chunks; an interrupted transcription resumes where it stopped
             
             **Features:**
             - Automatic language detection
             - Segment-level timestamps
             - High-quality transcription using Whisper Large V3 Turbo
+            - Click a transcript row (or the waveform) to play the audio from there
             
             **Output Format:**
-            - Timestamped transcription: `[MM:SS.ss - MM:SS.ss] text`
+            - Timestamped transcription: `[MM:SS.ss - MM:SS.ss] text`, shown in pages of 50 segments
             - Language detection
             - Audio duration
             - Full JSON data saved to transcripts/ folder
@@ -145,25 +244,81 @@ def create_interface(api_key=None):
         # Store the filename for download
         filename_state = gr.State()
         
+        # The full transcript stays on the server; only the current page is sent to the browser
+        segments_state = gr.State([])
+        page_state = gr.State(0)
+        seek_time = gr.Number(visible=False)
+        
+        transcript_outputs = [output_text, filename_state, download_btn, segments_state, page_state,
+                              transcript_table, page_label]
+        
         # Function to handle either input
-        def handle_audio_input(audio_file):
-            return transcribe_audio(audio_file)
+        def handle_audio_input(audio_file, recording, language, prompt, request: gr.Request):
+            # Each browser session gets its own fair share of the transcription slots
+            current_client.set(f"gradio:{request.session_hash}")
+            # Profiled for GROQ_PROFILE_PERCENT of the requests
+            with profile_request("web_transcribe"):
+                return transcribe_audio(audio_file or recording, language.strip(), prompt.strip())
+        
+        def show_player(audio_file, recording):
+            return render_player(audio_file or recording)
+        
+        def change_page(segments, page, step):
+            rows, page, label = transcript_page(segments, page + step)
+            return page, rows, label
+        
+        def seek_to_row(segments, page, evt: gr.SelectData):
+            index = page * TRANSCRIPT_PAGE_SIZE + evt.index[0]
+            return segments[index][0] if segments and index < len(segments) else None
         
         # Connect the button to the function
+        # No Gradio concurrency limit: the scheduler decides which transcription runs next
         transcribe_btn.click(
             fn=handle_audio_input,
-            inputs=[audio_input],
-            outputs=[output_text, filename_state, download_btn]
+            inputs=[audio_input, mic_input, language_input, prompt_input],
+            outputs=transcript_outputs,
+            concurrency_limit=None
         )
         
-        # Auto-transcribe when file is uploaded
-        audio_input.change(
-            fn=handle_audio_input,
-            inputs=[audio_input],
-            outputs=[output_text, filename_state, download_btn]
+        # Show the waveform and auto-transcribe when a file is uploaded or recorded. Separate
+        # listeners, so the transcription does not wait for the waveform's hashing and decoding,
+        # and neither queues behind other sessions under Gradio's default limit of one at a time
+        for source in (audio_input, mic_input):
+            source.change(
+                fn=show_player,
+                inputs=[audio_input, mic_input],
+                outputs=[player],
+                concurrency_limit=None
+            )
+            source.change(
+                fn=handle_audio_input,
+                inputs=[audio_input, mic_input, language_input, prompt_input],
+                outputs=transcript_outputs,
+                concurrency_limit=None
+            )
+        
+        # Page through the transcript
+        prev_btn.click(
+            fn=lambda segments, page: change_page(segments, page, -1),
+            inputs=[segments_state, page_state],
+            outputs=[page_state, transcript_table, page_label]
+        )
+        next_btn.click(
+            fn=lambda segments, page: change_page(segments, page, 1),
+            inputs=[segments_state, page_state],
+            outputs=[page_state, transcript_table, page_label]
         )
         
-
+        # Seek the player to the selected segment
+        transcript_table.select(
+            fn=seek_to_row,
+            inputs=[segments_state, page_state],
+            outputs=[seek_time]
+        ).then(
+            fn=None,
+            inputs=[seek_time],
+            js=SEEK_JS
+        )
         
         # Handle download button click
         download_btn.click(
@@ -177,6 +332,9 @@ def create_interface(api_key=None):
 if __name__ == "__main__":
     # Create and launch the interface
     demo = create_interface()
+    if not JOB_QUEUE_ENABLED:
+        # Open the API connections now rather than on the first transcription (workers do their own)
+        start_warm_pool(client)
     demo.launch(
         server_name="localhost",
         server_port=7860,
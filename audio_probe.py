@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Local preflight probe for audio inputs.
+
+Identifies the container and codec from magic bytes and reads the duration
+from container headers without decoding any audio, so unsupported or
+oversized inputs are rejected before they are uploaded to the Groq API.
+"""
+
+import os
+import struct
+from typing import Any, BinaryIO, Dict, Optional
+
+# Groq rejects uploads above 25 MB on the free tier; override for paid tiers
+MAX_UPLOAD_BYTES = int(float(os.getenv("GROQ_MAX_FILE_SIZE_MB", "25")) * 1024 * 1024)
+
+# Optional upper bound on audio length (seconds), disabled when unset
+MAX_DURATION_SECONDS = float(os.getenv("GROQ_MAX_DURATION_SECONDS", "0")) or None
+
+# Number of leading bytes needed to identify every supported container
+SNIFF_BYTES = 4096
+
+# Extension the upload should carry for each detected container
+FORMAT_EXTENSIONS = {
+    "wav": ".wav",
+    "mp3": ".mp3",
+    "mp4": ".m4a",
+    "webm": ".webm",
+    "ogg": ".ogg",
+    "flac": ".flac",
+}
+
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+_MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+# Consecutive MPEG frame headers required to recognise an MP3 stream; two
+# frames of the largest size plus the next header still fit in SNIFF_BYTES
+MP3_SYNC_FRAMES = 3
+
+_WAV_CODECS = {1: "pcm_s", 3: "pcm_f", 6: "alaw", 7: "mulaw", 0x55: "mp3"}
+
+_MP4_CODECS = {"mp4a": "aac", "alac": "alac", "Opus": "opus", "fLaC": "flac", "ac-3": "ac3", "ec-3": "eac3"}
+
+
+class AudioProbeError(ValueError):
+    """Raised when an input is unsupported, malformed or over the limits."""
+
+
+def sniff_format(header: bytes) -> Optional[str]:
+    """
+    Identify the audio container from its leading bytes
+
+    Args:
+        header: First bytes of the file (SNIFF_BYTES is always enough)
+
+    Returns:
+        Container name (a key of FORMAT_EXTENSIONS) or None if unrecognised
+    """
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[4:8] == b"ftyp":
+        return "mp4"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:3] == b"ID3":
+        # ID3v2 tags may prefix either MP3 or (rarely) FLAC streams
+        offset = 10 + _syncsafe(header[6:10])
+        if header[offset:offset + 4] == b"fLaC":
+            return "flac"
+        # Large tags (cover art) can hide the first frame beyond the header
+        if offset + 4 > len(header) or _mp3_frames_at(header, offset):
+            return "mp3"
+        return None
+    if _mp3_frames_at(header, 0):
+        return "mp3"
+    return None
+
+
+def probe_audio(path: str) -> Dict[str, Any]:
+    """
+    Probe an audio file's container, codec and duration from its headers
+
+    Args:
+        path: Path to the local audio file
+
+    Returns:
+        Dictionary with format, codec, extension, size and duration
+        (duration is None when the container does not record it)
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(SNIFF_BYTES)
+        fmt = sniff_format(header)
+        if fmt is None:
+            raise AudioProbeError("Unsupported or unrecognised audio format")
+
+        f.seek(0)
+        try:
+            codec, duration = _PROBERS[fmt](f, size)
+        except (struct.error, IndexError, ValueError) as e:
+            raise AudioProbeError(f"Malformed {fmt.upper()} file: {e}") from e
+
+    return {
+        "format": fmt,
+        "codec": codec,
+        "extension": FORMAT_EXTENSIONS[fmt],
+        "size": size,
+        "duration": duration,
+    }
+
+
+def check_upload_size(size: int, max_bytes: Optional[int] = None) -> None:
+    """Raise AudioProbeError if an upload of `size` bytes would be rejected"""
+    limit = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if size <= 0:
+        raise AudioProbeError("Audio file is empty")
+    if size > limit:
+        raise AudioProbeError(
+            f"Audio file is {size / 1024 / 1024:.1f} MB, over the {limit / 1024 / 1024:.1f} MB upload limit"
+        )
+
+
+def preflight_audio(path: str, max_bytes: Optional[int] = None,
+                    max_duration: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Validate a local audio file before uploading it
+
+    Args:
+        path: Path to the local audio file
+        max_bytes: Upload size limit (default: MAX_UPLOAD_BYTES)
+        max_duration: Duration limit in seconds (default: MAX_DURATION_SECONDS)
+
+    Returns:
+        The probe_audio() result for the file
+    """
+    check_upload_size(os.path.getsize(path), max_bytes)
+    info = probe_audio(path)
+
+    limit = MAX_DURATION_SECONDS if max_duration is None else max_duration
+    if limit and info["duration"] and info["duration"] > limit:
+        raise AudioProbeError(
+            f"Audio is {info['duration']:.0f} seconds long, over the {limit:.0f} second limit"
+        )
+    return info
+
+
+# ---------------------------------------------------------------------------
+# Container-specific header readers. Each returns (codec, duration_seconds).
+# ---------------------------------------------------------------------------
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _probe_wav(f: BinaryIO, size: int):
+    header = f.read(12)
+    codec, byte_rate, data_size = None, None, None
+    pos = 12
+    while pos + 8 <= size:
+        f.seek(pos)
+        chunk_id, chunk_size = struct.unpack("<4sI", f.read(8))
+        if chunk_id == b"fmt ":
+            fmt_chunk = f.read(16)
+            audio_format, _, _, byte_rate, _, bits = struct.unpack("<HHIIHH", fmt_chunk)
+            if audio_format == 0xFFFE:
+                # WAVE_FORMAT_EXTENSIBLE: the real format is the subformat GUID's first word
+                f.seek(pos + 8 + 24)
+                audio_format = struct.unpack("<H", f.read(2))[0]
+            codec = _WAV_CODECS.get(audio_format, f"wav_0x{audio_format:04x}")
+            if codec in ("pcm_s", "pcm_f"):
+                codec = f"{codec}{bits}le"
+        elif chunk_id == b"data":
+            # Streamed WAVs leave the size at 0 or 0xFFFFFFFF; fall back to the file size
+            remaining = size - pos - 8
+            data_size = chunk_size if 0 < chunk_size <= remaining else remaining
+            break
+        pos += 8 + chunk_size + (chunk_size & 1)
+
+    if header[:4] != b"RIFF" or codec is None:
+        raise ValueError("missing fmt chunk")
+    duration = data_size / byte_rate if byte_rate and data_size is not None else None
+    return codec, duration
+
+
+def _parse_mp3_frame(header: bytes, offset: int) -> Optional[Dict[str, Any]]:
+    if offset + 4 > len(header):
+        return None
+    b1, b2, b3 = header[offset + 1], header[offset + 2], header[offset + 3]
+    if header[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = {0: 2.5, 2: 2, 3: 1}.get((b1 >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 3)
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version != 1:
+        samples, length = 576, 72 * bitrate // sample_rate + padding
+    else:
+        samples, length = 1152, 144 * bitrate // sample_rate + padding
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "samples": samples,
+        "length": length,
+        "mono": (b3 >> 6) == 3,
+    }
+
+
+def _mp3_frames_at(header: bytes, pos: int, count: int = MP3_SYNC_FRAMES) -> bool:
+    """Whether `count` consecutive frames of one stream start at `pos`, all inside the header"""
+    first = frame = _parse_mp3_frame(header, pos)
+    if first is None:
+        return False
+    for _ in range(count - 1):
+        pos += frame["length"]
+        if pos == len(header):
+            # A stream shorter than the header ends after its last frame
+            return True
+        frame = _parse_mp3_frame(header, pos)
+        if frame is None or any(frame[key] != first[key] for key in ("version", "layer", "sample_rate")):
+            return False
+    return True
+
+
+def _find_mp3_frame(header: bytes, start: int) -> Optional[int]:
+    """Find the first frame followed by consecutive frames of the same stream"""
+    pos = header.find(b"\xff", start)
+    while pos != -1:
+        if _mp3_frames_at(header, pos):
+            return pos
+        pos = header.find(b"\xff", pos + 1)
+    return None
+
+
+def _probe_mp3(f: BinaryIO, size: int):
+    header = f.read(10)
+    start = 10 + _syncsafe(header[6:10]) if header[:3] == b"ID3" else 0
+    f.seek(start)
+    data = f.read(64 * 1024)
+    offset = _find_mp3_frame(data, 0)
+    if offset is None:
+        raise ValueError("no MPEG audio frame found")
+    frame = _parse_mp3_frame(data, offset)
+    codec = "mp3" if frame["layer"] == 3 else f"mp{frame['layer']}"
+
+    # VBR files carry the total frame count in a Xing/Info or VBRI header
+    if frame["version"] == 1:
+        side_info = 17 if frame["mono"] else 32
+    else:
+        side_info = 9 if frame["mono"] else 17
+    xing = offset + 4 + side_info
+    frames = None
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+    elif data[offset + 36:offset + 40] == b"VBRI":
+        frames = struct.unpack(">I", data[offset + 50:offset + 54])[0]
+
+    if frames:
+        return codec, frames * frame["samples"] / frame["sample_rate"]
+
+    # Constant bitrate: estimate from the audio payload size
+    audio_bytes = size - start - offset
+    return codec, audio_bytes * 8 / frame["bitrate"]
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        box_size, box_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < header:
+            raise ValueError("invalid box size")
+        yield box_type.decode("latin-1"), pos + header, min(pos + box_size, end)
+        pos += box_size
+
+
+def _find_box(data: bytes, start: int, end: int, path: str):
+    for name in path.split("/"):
+        for box_type, body_start, body_end in _iter_boxes(data, start, end):
+            if box_type == name:
+                start, end = body_start, body_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def _probe_mp4(f: BinaryIO, size: int):
+    # The moov box may sit before or after the media data; walk top-level boxes by seeking
+    moov = None
+    pos = 0
+    while pos + 8 <= size:
+        f.seek(pos)
+        box_size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif box_size == 0:
+            box_size = size - pos
+        if box_size < header:
+            raise ValueError("invalid box size")
+        if box_type == b"moov":
+            moov = f.read(min(box_size - header, 64 * 1024 * 1024))
+            break
+        pos += box_size
+
+    if moov is None:
+        raise ValueError("missing moov box")
+
+    duration = None
+    mvhd = _find_box(moov, 0, len(moov), "mvhd")
+    if mvhd:
+        body = mvhd[0]
+        if moov[body] == 1:
+            timescale, length = struct.unpack(">IQ", moov[body + 20:body + 32])
+        else:
+            timescale, length = struct.unpack(">II", moov[body + 12:body + 20])
+        duration = length / timescale if timescale else None
+
+    codec = None
+    for box_type, trak_start, trak_end in _iter_boxes(moov, 0, len(moov)):
+        if box_type != "trak":
+            continue
+        hdlr = _find_box(moov, trak_start, trak_end, "mdia/hdlr")
+        if not hdlr or moov[hdlr[0] + 8:hdlr[0] + 12] != b"soun":
+            continue
+        stsd = _find_box(moov, trak_start, trak_end, "mdia/minf/stbl/stsd")
+        if stsd:
+            entry = moov[stsd[0] + 12:stsd[0] + 16].decode("latin-1")
+            codec = _MP4_CODECS.get(entry, entry.strip().lower())
+        break
+
+    if codec is None:
+        raise ValueError("no audio track")
+    return codec, duration
+
+
+def _read_vint(data: bytes, pos: int, keep_marker: bool = False):
+    first = data[pos]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ValueError("invalid EBML variable-length integer")
+    value = first if keep_marker else first & (0xFF >> length)
+    for b in data[pos + 1:pos + length]:
+        value = (value << 8) | b
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, unknown
+
+
+def _probe_webm(f: BinaryIO, size: int):
+    # Segment Info and Tracks precede the first Cluster, so the head of the file is enough
+    data = f.read(1024 * 1024)
+    timecode_scale, duration, codec = 1000000, None, None
+    containers = {0x18538067, 0x1549A966, 0x1654AE6B, 0xAE}
+    pos = 0
+    while pos < len(data):
+        element_id, id_len, _ = _read_vint(data, pos, keep_marker=True)
+        length, size_len, unknown = _read_vint(data, pos + id_len)
+        body = pos + id_len + size_len
+        if element_id == 0x1F43B675:
+            break
+        if element_id in containers:
+            # Descend into Segment, Info, Tracks and TrackEntry
+            pos = body
+            continue
+        value = data[body:body + length]
+        if element_id == 0x2AD7B1:
+            timecode_scale = int.from_bytes(value, "big")
+        elif element_id == 0x4489:
+            duration = struct.unpack(">f" if length == 4 else ">d", value)[0]
+        elif element_id == 0x86 and codec is None:
+            codec = value.decode("ascii", "replace").rstrip("\x00")
+        if unknown:
+            break
+        pos = body + length
+
+    if codec is None:
+        raise ValueError("no CodecID found")
+    codec = codec.lower()[2:] if codec.startswith("A_") else codec.lower()
+    # Browser MediaRecorder output omits Duration until it is remuxed
+    seconds = duration * timecode_scale / 1e9 if duration else None
+    return codec, seconds
+
+
+def _probe_ogg(f: BinaryIO, size: int):
+    page = f.read(SNIFF_BYTES)
+    segments = page[26]
+    packet = page[27 + segments:]
+    if packet.startswith(b"OpusHead"):
+        codec, rate = "opus", 48000
+        pre_skip = struct.unpack("<H", packet[10:12])[0]
+    elif packet.startswith(b"\x01vorbis"):
+        codec, rate = "vorbis", struct.unpack("<I", packet[12:16])[0]
+        pre_skip = 0
+    elif packet.startswith(b"\x7fFLAC"):
+        # "\x7fFLAC", version (2), header count (2), "fLaC", then the STREAMINFO block header (4)
+        codec, rate = "flac", _flac_stream_info(packet[17:])[0]
+        pre_skip = 0
+    else:
+        raise ValueError("unknown Ogg codec")
+
+    # The final page's granule position is the total sample count
+    f.seek(max(0, size - 65536))
+    tail = f.read()
+    last = tail.rfind(b"OggS")
+    if last == -1 or last + 14 > len(tail):
+        return codec, None
+    granule = struct.unpack("<q", tail[last + 6:last + 14])[0]
+    if granule <= 0 or not rate:
+        return codec, None
+    return codec, max(0, granule - pre_skip) / rate
+
+
+def _flac_stream_info(block: bytes):
+    bits = int.from_bytes(block[10:18], "big")
+    sample_rate = bits >> 44
+    total_samples = bits & ((1 << 36) - 1)
+    return sample_rate, total_samples
+
+
+def _probe_flac(f: BinaryIO, size: int):
+    header = f.read(10)
+    start = 10 + _syncsafe(header[6:10]) if header[:3] == b"ID3" else 0
+    f.seek(start)
+    data = f.read(4 + 4 + 34)
+    if data[:4] != b"fLaC" or data[4] & 0x7F != 0:
+        raise ValueError("missing STREAMINFO block")
+    sample_rate, total_samples = _flac_stream_info(data[8:])
+    duration = total_samples / sample_rate if sample_rate and total_samples else None
+    return "flac", duration
+
+
+_PROBERS = {
+    "wav": _probe_wav,
+    "mp3": _probe_mp3,
+    "mp4": _probe_mp4,
+    "webm": _probe_webm,
+    "ogg": _probe_ogg,
+    "flac": _probe_flac,
+}
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Latency of the first transcription request against steady-state requests.
+
+Sends short synthetic clips through a plain Groq client (the SDK's default
+connection handling) and through api_client's pre-warmed, kept-alive pool,
+and times for each: the first request after startup, the median of the
+following requests, and the first request after sitting idle. The local
+fake API (fake_groq_server.py) charges --connect-latency for every new
+connection, standing in for DNS, TCP and TLS setup, and closes connections
+idle for --idle-timeout seconds, as load balancers do.
+
+Usage:
+    python bench_connections.py                     # local fake API
+    python bench_connections.py --idle 40 --requests 20
+    python bench_connections.py --real              # the real API (GROQ_API_KEY / GROQ_BASE_URL)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("GROQ_API_KEY", "fake")
+
+from groq import Groq
+import api_client
+from chunked_transcription import transcribe_chunk
+from fake_groq_server import FakeGroqHandler, server_url, start_fake_server
+from mcp_diagnostics import synthetic_clip
+
+MODEL = "whisper-large-v3-turbo"
+
+
+def timed_request(client) -> float:
+    """Seconds for one transcription of a 1 s clip"""
+    started = time.perf_counter()
+    transcribe_chunk(client, synthetic_clip(1.0), "clip.wav", MODEL, {})
+    return time.perf_counter() - started
+
+
+def run_scenario(name, make_client, args, warm=False):
+    connections_before = FakeGroqHandler.connections_opened
+    client = make_client()
+    stop = None
+    if warm:
+        # The bench pings more often than the default so the short idle timeout is covered
+        stop = api_client.start_warm_pool(client, interval=args.keepalive)
+
+    first = timed_request(client)
+    steady = [timed_request(client) for _ in range(args.requests)]
+    time.sleep(args.idle)
+    after_idle = timed_request(client)
+    if stop is not None:
+        stop.set()
+
+    return {
+        "scenario": name,
+        "first_ms": first * 1000,
+        "steady_p50_ms": statistics.median(steady) * 1000,
+        "steady_max_ms": max(steady) * 1000,
+        "after_idle_ms": after_idle * 1000,
+        "connections_opened": None if args.real else FakeGroqHandler.connections_opened - connections_before,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="First-request vs steady-state API latency benchmark")
+    parser.add_argument("--requests", type=int, default=10, help="Steady-state requests per scenario")
+    parser.add_argument("--idle", type=float, default=8.0, help="Idle seconds before the last request")
+    parser.add_argument("--connect-latency", type=float, default=0.15,
+                        help="Fake API: seconds charged per new connection")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake API: seconds per transcription")
+    parser.add_argument("--idle-timeout", type=float, default=6.0,
+                        help="Fake API: close connections idle for this many seconds")
+    parser.add_argument("--keepalive", type=float, default=2.0, help="Keep-alive ping interval of the warm pool")
+    parser.add_argument("--real", action="store_true", help="Use the real API instead of the local fake")
+    parser.add_argument("--output", help="Write all records as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if not args.real:
+        server = start_fake_server(latency=args.latency, connect_latency=args.connect_latency,
+                                   idle_timeout=args.idle_timeout)
+        os.environ["GROQ_BASE_URL"] = server_url(server)
+        print(f"🧪 Fake API at {server_url(server)}: {args.connect_latency * 1000:.0f} ms per new connection, "
+              f"idle connections closed after {args.idle_timeout:g}s")
+
+    records = [
+        run_scenario("default client", Groq, args),
+        run_scenario("warm pool", api_client.create_client, args, warm=True),
+    ]
+
+    print(f"\n⏱️  {args.requests} steady-state requests, then {args.idle:g}s idle")
+    print(f"   {'scenario':<16} {'first ms':>9} {'steady p50':>11} {'steady max':>11} {'after idle':>11} {'conns':>6}")
+    for record in records:
+        connections = record["connections_opened"] if record["connections_opened"] is not None else "-"
+        print(f"   {record['scenario']:<16} {record['first_ms']:>9.1f} {record['steady_p50_ms']:>11.1f} "
+              f"{record['steady_max_ms']:>11.1f} {record['after_idle_ms']:>11.1f} {connections:>6}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(records, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Peak-memory regression benchmark for every transcription entry point.
+
+Each entry point is run in its own subprocess against the local fake Groq
+API (fake_groq_server.py) with synthetic WAV inputs, and the peak memory of
+each stage is recorded with tracemalloc alongside the process's peak RSS.
+The run fails (exit code 1) when the peak memory per input byte of any entry
+point, beyond a fixed allowance, goes over its threshold, so large-input
+regressions break the build.
+
+Usage:
+    python bench_memory.py                          # 10, 50 and 100 MB inputs
+    python bench_memory.py --sizes 10,500 --entry-points mcp_file,app
+    python bench_memory.py --output bench_output.txt
+"""
+
+import os
+import sys
+import json
+import base64
+import struct
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+
+ENTRY_POINTS = ("mcp_file", "mcp_url", "app", "cli")
+
+# Highest allowed tracemalloc peak per input byte over the whole call, after
+# subtracting a fixed allowance for imports, clients and per-request buffers
+MAX_PEAK_PER_INPUT_BYTE = {
+    "mcp_file": 0.25,
+    "mcp_url": 0.25,
+    "app": 0.25,
+    "cli": 0.25,
+}
+
+# Highest allowed growth in peak RSS per input byte; looser because it also
+# counts allocator fragmentation and buffers outside the Python heap
+MAX_RSS_PER_INPUT_BYTE = {
+    "mcp_file": 0.5,
+    "mcp_url": 0.5,
+    "app": 0.5,
+    "cli": 0.5,
+}
+
+# Size-independent memory excluded before applying the per-byte limits
+PEAK_ALLOWANCE_BYTES = 8 * 1024 * 1024
+RSS_ALLOWANCE_BYTES = 32 * 1024 * 1024
+
+MB = 1024 * 1024
+
+
+def write_synthetic_wav(path, size_bytes, sample_rate=16000, seed=0):
+    """
+    Write a 16-bit mono WAV of roughly size_bytes without holding it in memory: seeded
+    noise bursts of random length and loudness between pauses, so like speech it has
+    pauses to cut at and no two chunks sound alike
+    """
+    data_size = (size_bytes - 44) & ~1
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE")
+        f.write(b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16))
+        f.write(b"data" + struct.pack("<I", data_size))
+        remaining = data_size // 2
+        segment_left, gain, sounding = 0, 0.0, False
+        while remaining:
+            count = min(remaining, 2 * MB)
+            gains = np.empty(count, dtype=np.float32)
+            position = 0
+            while position < count:
+                if not segment_left:
+                    # Alternate 0.5-4 s bursts and 0.3-1.5 s pauses
+                    sounding = not sounding
+                    seconds = rng.uniform(0.5, 4.0) if sounding else rng.uniform(0.3, 1.5)
+                    segment_left = int(seconds * sample_rate)
+                    gain = rng.uniform(0.05, 0.3) if sounding else 0.0
+                step = min(segment_left, count - position)
+                gains[position:position + step] = gain
+                position += step
+                segment_left -= step
+            samples = rng.standard_normal(count, dtype=np.float32) * gains
+            f.write((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+            remaining -= count
+
+
+def _proc_status_bytes(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def reset_peak_rss():
+    """
+    Start peak RSS tracking from the current RSS where the OS allows it (Linux),
+    so building the input does not hide the entry point's own peak. Returns the
+    RSS the growth is measured from.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _proc_status_bytes("VmRSS")
+    except OSError:
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    try:
+        return _proc_status_bytes("VmHWM")
+    except OSError:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+class StageTracker:
+    """Records the tracemalloc peak reached inside each (possibly nested) stage"""
+
+    def __init__(self):
+        self.peaks = {}
+        self.active = []
+
+    def _fold(self):
+        # reset_peak() is global, so fold the peak into every open stage before resetting it
+        peak = tracemalloc.get_traced_memory()[1]
+        for name, start in self.active:
+            self.peaks[name] = max(self.peaks.get(name, 0), peak - start)
+
+    @contextmanager
+    def stage(self, name):
+        self._fold()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self.active.append((name, current))
+        try:
+            yield
+        finally:
+            self._fold()
+            self.active.pop()
+
+    def wrap(self, module, attribute, name):
+        """Replace module.attribute with a version that runs as a stage"""
+        func = getattr(module, attribute)
+
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+
+        setattr(module, attribute, wrapper)
+
+
+def run_child(entry_point, wav_path, size_bytes, server):
+    """Measure one entry point in this (fresh) process and return its records"""
+    import chunked_transcription
+
+    # Record every transcription's chunk counts; entry points import the function by
+    # name, so it is replaced before any of them is imported
+    chunk_counts = []
+    transcribe_long_audio = chunked_transcription.transcribe_long_audio
+
+    def counted_transcription(*args, **kwargs):
+        transcription = transcribe_long_audio(*args, **kwargs)
+        chunk_counts.append(transcription["chunks"])
+        return transcription
+
+    chunked_transcription.transcribe_long_audio = counted_transcription
+
+    tracker = StageTracker()
+    for attribute, name in (("file_digest", "digest"), ("decode_features", "features"),
+                            ("extract_chunk", "extract_chunk"),
+                            ("transcribe_chunk", "api_call"), ("stitch_results", "stitch")):
+        tracker.wrap(chunked_transcription, attribute, f"transcribe/{name}")
+
+    if entry_point in ("mcp_file", "mcp_url"):
+        import mcp_server
+        tracker.wrap(mcp_server, "preflight_audio", "preflight")
+        tracker.wrap(mcp_server, "run_transcription", "transcribe")
+        if entry_point == "mcp_file":
+            tracker.wrap(base64, "b64decode", "b64decode")
+            with open(wav_path, "rb") as f:
+                # The server receives the payload already decoded from JSON-RPC
+                payload = "".join(base64.b64encode(block).decode() for block in iter(lambda: f.read(3 * MB), b""))
+            call = lambda: mcp_server.transcribe_audio_file(payload, os.path.basename(wav_path))
+        else:
+            url = f"{server}/{os.path.basename(wav_path)}"
+            call = lambda: mcp_server.transcribe_audio_url(url)
+    elif entry_point == "app":
+        import app
+        from groq import Groq
+        app.client = Groq()
+        tracker.wrap(app, "preflight_audio", "preflight")
+        tracker.wrap(app, "run_transcription", "transcribe")
+        tracker.wrap(json, "dump", "json_dump")
+        call = lambda: app.transcribe_audio(wav_path)
+    else:
+        import main
+        from groq import Groq
+        client = Groq()
+        # main() creates the output directory before transcribing
+        os.makedirs(main.TRANSCRIPTS_DIR, exist_ok=True)
+        tracker.wrap(main, "preflight_audio", "preflight")
+        tracker.wrap(main, "transcribe_long_audio", "transcribe")
+        call = lambda: main.transcribe_file(client, wav_path, "whisper-large-v3-turbo")
+
+    rss_before = reset_peak_rss()
+    tracemalloc.start()
+    with tracker.stage("total"):
+        result = call()
+        if entry_point.startswith("mcp"):
+            # FastMCP serializes the tool result to JSON before sending it
+            with tracker.stage("serialize"):
+                json.dumps(result, default=str)
+    tracemalloc.stop()
+    rss_growth = peak_rss_bytes() - rss_before
+
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(result["error"])
+    if isinstance(result, tuple) and result[1] is None:
+        raise RuntimeError(result[0])
+    # The input never repeats, so reusing a chunk would mean telling different audio apart failed
+    if not chunk_counts or any(counts["reused"] for counts in chunk_counts):
+        raise RuntimeError(f"Expected every chunk to be transcribed, got chunk counts {chunk_counts}")
+
+    records = [
+        {"entry_point": entry_point, "size_mb": size_bytes / MB, "stage": stage,
+         "peak_bytes": peak, "per_input_byte": peak / size_bytes}
+        for stage, peak in sorted(tracker.peaks.items())
+    ]
+    records.append({"entry_point": entry_point, "size_mb": size_bytes / MB, "stage": "rss",
+                    "peak_bytes": rss_growth, "per_input_byte": rss_growth / size_bytes})
+    return records
+
+
+def start_server(directory):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_groq_server.py"),
+         "--port", "0", "--static-dir", directory],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return process, process.stdout.readline().strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak-memory regression benchmark")
+    parser.add_argument("--sizes", default="10,50,100", help="Comma-separated input sizes in MB (default: 10,50,100)")
+    parser.add_argument("--entry-points", default=",".join(ENTRY_POINTS), help="Comma-separated entry points")
+    parser.add_argument("--output", help="Write all records as JSON to this file")
+    parser.add_argument("--child", nargs=4, metavar=("ENTRY", "WAV", "SIZE", "SERVER"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        entry_point, wav_path, size_bytes, server = args.child
+        print(json.dumps(run_child(entry_point, wav_path, int(size_bytes), server)))
+        return 0
+
+    sizes = [float(size) for size in args.sizes.split(",")]
+    entry_points = args.entry_points.split(",")
+    records, failures = [], []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        server, url = start_server(work_dir)
+        try:
+            for size_mb in sizes:
+                size_bytes = int(size_mb * MB)
+                wav_path = os.path.join(work_dir, f"synthetic_{int(size_mb)}mb.wav")
+                write_synthetic_wav(wav_path, size_bytes)
+
+                for entry_point in entry_points:
+                    # Fresh stores so no entry point reuses another's results
+                    env = dict(os.environ, GROQ_BASE_URL=url, GROQ_API_KEY="fake",
+                               GROQ_CHUNK_STORE_DIR=tempfile.mkdtemp(dir=work_dir))
+                    completed = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "--child",
+                         entry_point, wav_path, str(size_bytes), url],
+                        capture_output=True, text=True, env=env, cwd=work_dir,
+                    )
+                    if completed.returncode != 0:
+                        failures.append(f"{entry_point} @ {size_mb:g} MB crashed: {completed.stderr.strip()[-500:]}")
+                        continue
+
+                    case = json.loads(completed.stdout.strip().splitlines()[-1])
+                    records.extend(case)
+                    print(f"\n📏 {entry_point} @ {size_mb:g} MB")
+                    for record in case:
+                        print(f"   {record['stage']:<28} {record['peak_bytes'] / MB:9.1f} MB  "
+                              f"{record['per_input_byte']:6.3f} B/B")
+
+                    by_stage = {record["stage"]: record["peak_bytes"] for record in case}
+                    for stage, limits, allowance in (("total", MAX_PEAK_PER_INPUT_BYTE, PEAK_ALLOWANCE_BYTES),
+                                                     ("rss", MAX_RSS_PER_INPUT_BYTE, RSS_ALLOWANCE_BYTES)):
+                        per_byte = max(0, by_stage[stage] - allowance) / size_bytes
+                        if per_byte > limits[entry_point]:
+                            failures.append(f"{entry_point} @ {size_mb:g} MB: {stage} uses {per_byte:.3f} bytes "
+                                            f"per input byte beyond the {allowance // MB} MB allowance "
+                                            f"(limit {limits[entry_point]})")
+                os.unlink(wav_path)
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(records, f, indent=2)
+
+    if failures:
+        print("\n❌ Memory regressions:")
+        for failure in failures:
+            print(f"   • {failure}")
+        return 1
+    print("\n✅ All entry points within their memory budgets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Payload size and serialization time of the MCP result formats.
+
+Runs transcribe_audio_file with the transcription replaced by a synthetic
+verbose_json result (fake_groq_server.build_transcription) of each duration,
+once per result format, and measures the JSON the server would send: its
+size, the time to build the result and json.dumps it, and the time to decode
+columnar results back to rows. The row format with words is what the
+columnar format with words replaces.
+
+Usage:
+    python bench_wire_format.py                    # 10 min, 1 h and 3 h transcripts
+    python bench_wire_format.py --minutes 60,600 --repeat 10
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+os.environ.setdefault("GROQ_API_KEY", "fake")
+
+import mcp_server
+from fake_groq_server import build_transcription
+from mcp_diagnostics import synthetic_clip
+from wire_format import expand_result
+
+CASES = (
+    ("json", False),
+    ("json", True),
+    ("columnar", False),
+    ("columnar", True),
+)
+
+
+def best_time(func, repeat):
+    """Fastest of `repeat` runs, in seconds, and the last return value"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def measure(minutes, repeat):
+    transcription = build_transcription(minutes * 60.0)
+    transcription["chunks"] = None
+    mcp_server.run_transcription = lambda *args, **kwargs: transcription
+    audio_data = base64.b64encode(synthetic_clip(1.0)).decode()
+
+    records = []
+    for result_format, include_words in CASES:
+        result = mcp_server.transcribe_audio_file(audio_data, "clip.wav", include_words=include_words,
+                                                  result_format=result_format)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+
+        # The whole tool call, of which only building the result depends on the format
+        build_seconds, _ = best_time(
+            lambda: mcp_server.transcribe_audio_file(audio_data, "clip.wav", include_words=include_words,
+                                                     result_format=result_format),
+            repeat,
+        )
+        dumps_seconds, payload = best_time(lambda: json.dumps(result, default=str), repeat)
+        decode_seconds = best_time(lambda: expand_result(json.loads(payload)), repeat)[0] \
+            if result_format == "columnar" else None
+
+        records.append({
+            "minutes": minutes,
+            "format": result_format + ("+words" if include_words else ""),
+            "segments": len(transcription["segments"]),
+            "words": len(transcription["words"]),
+            "bytes": len(payload.encode()),
+            "build_ms": build_seconds * 1000,
+            "dumps_ms": dumps_seconds * 1000,
+            "decode_ms": decode_seconds * 1000 if decode_seconds is not None else None,
+        })
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MCP result format size and serialization benchmark")
+    parser.add_argument("--minutes", default="10,60,180", help="Comma-separated transcript lengths in minutes")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the fastest is kept")
+    parser.add_argument("--output", help="Write all records as JSON to this file")
+    args = parser.parse_args(argv)
+
+    all_records = []
+    for minutes in (float(value) for value in args.minutes.split(",")):
+        records = measure(minutes, args.repeat)
+        all_records.extend(records)
+        baseline = {record["format"]: record["bytes"] for record in records}
+
+        print(f"\n📦 {minutes:g} min transcript ({records[0]['segments']} segments, {records[0]['words']} words)")
+        print(f"   {'format':<16} {'bytes':>11} {'vs json':>8} {'build ms':>9} {'dumps ms':>9} {'decode ms':>10}")
+        for record in records:
+            reference = baseline["json+words" if record["format"].endswith("+words") else "json"]
+            decode = f"{record['decode_ms']:10.1f}" if record["decode_ms"] is not None else f"{'-':>10}"
+            print(f"   {record['format']:<16} {record['bytes']:>11,} {record['bytes'] / reference:>7.0%} "
+                  f"{record['build_ms']:>9.1f} {record['dumps_ms']:>9.1f} {decode}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(all_records, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
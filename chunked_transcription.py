@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Checkpointed transcription of long audio files.
+
+Long inputs are split with ffmpeg into chunks cut at pauses in the speech
+(see content_chunking.py) and transcribed one chunk at a time. Each finished
+chunk's verbose_json result is stored under the chunk's audio fingerprint and
+the transcription parameters, so a restarted process resumes from the first
+unfinished chunk, an edited version of the same recording only uploads (and
+pays for) the chunks whose audio changed, and a retry with another language or
+prompt only re-sends the chunks transcribed with low confidence. Files small
+enough for a single upload are stored as one chunk, keyed by their content hash.
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from typing import Any, Callable, Dict, List, Optional
+from audio_probe import MAX_UPLOAD_BYTES, check_upload_size, probe_audio
+from content_chunking import FRAME_SECONDS, MIN_CHUNK_SECONDS, ChunkStore, decode_features, plan_cuts
+
+# Length of each uploaded chunk; 10 minutes of 16 kHz mono FLAC stays well under 25 MB
+CHUNK_SECONDS = float(os.getenv("GROQ_CHUNK_SECONDS", "600"))
+
+# Largest input accepted when it can be split into chunks locally
+MAX_INPUT_BYTES = int(float(os.getenv("GROQ_MAX_INPUT_SIZE_MB", "2048")) * 1024 * 1024)
+
+def ffmpeg_available() -> bool:
+    """Whether long files can be split locally"""
+    return shutil.which("ffmpeg") is not None
+
+
+def max_input_bytes() -> int:
+    """Size limit for inputs: large files are fine when they can be chunked"""
+    return MAX_INPUT_BYTES if ffmpeg_available() else MAX_UPLOAD_BYTES
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's content, read in blocks"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def extract_chunk(path: str, start: float, length: float, output_path: str) -> None:
+    """Cut [start, start + length) seconds to 16 kHz mono FLAC, the format Whisper uses internally"""
+    subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+            "-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", path,
+            "-vn", "-ac", "1", "-ar", "16000", "-c:a", "flac", output_path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+
+def transcribe_chunk(client, file, upload_name: str, model: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Send one file or chunk to the API and return its verbose_json result as a dict"""
+    transcription = client.audio.transcriptions.create(
+        file=(upload_name, file),
+        model=model,
+        response_format="verbose_json",
+        timestamp_granularities=["word", "segment"],
+        temperature=0.0,
+        **options
+    )
+    return transcription.to_dict()
+
+
+def shift_result(result: Dict[str, Any], offset: float) -> Dict[str, Any]:
+    """Move a chunk's segment and word timestamps to their position in the full file"""
+    shifted = dict(result)
+    shifted["segments"] = [
+        {**segment, "start": segment["start"] + offset, "end": segment["end"] + offset}
+        for segment in result.get("segments") or []
+    ]
+    shifted["words"] = [
+        {**word, "start": word["start"] + offset, "end": word["end"] + offset}
+        for word in result.get("words") or []
+    ]
+    return shifted
+
+
+def stitch_results(chunks: List[Dict[str, Any]], offsets: List[float]) -> Dict[str, Any]:
+    """Join per-chunk results into one verbose_json-shaped transcription"""
+    segments, words, texts = [], [], []
+    for chunk, offset in zip(chunks, offsets):
+        shifted = shift_result(chunk, offset)
+        for segment in shifted["segments"]:
+            segments.append({**segment, "id": len(segments)})
+        words.extend(shifted["words"])
+        if chunk.get("text"):
+            texts.append(chunk["text"].strip())
+
+    last_duration = (chunks[-1].get("duration") or 0.0) if chunks else 0.0
+    return {
+        "text": " ".join(texts),
+        "language": chunks[0].get("language") if chunks else None,
+        "duration": (offsets[-1] + last_duration) if chunks else 0.0,
+        "segments": segments,
+        "words": words,
+    }
+
+
+def transcribe_long_audio(client, path: str, model: str = "whisper-large-v3-turbo",
+                          language: Optional[str] = None, prompt: Optional[str] = None,
+                          probe: Optional[Dict[str, Any]] = None,
+                          chunk_seconds: float = CHUNK_SECONDS,
+                          progress: Optional[Callable[[int, Optional[int]], None]] = None) -> Dict[str, Any]:
+    """
+    Transcribe a file of any length, resuming from checkpoints of earlier attempts
+
+    Args:
+        client: Groq client
+        path: Local audio file
+        model: Whisper model to use
+        language: Optional language code
+        prompt: Optional context or spelling prompt
+        probe: audio_probe.probe_audio() result, probed here if not given
+        chunk_seconds: Maximum length of each uploaded chunk
+        progress: Called with (chunks done, total chunks or None) after each chunk
+
+    Returns:
+        verbose_json-shaped dict with text, language, duration, segments and words, and
+        {"total", "reused", "reused_other_params"} chunk counts under "chunks"
+    """
+    probe = probe or probe_audio(path)
+    options = {}
+    if language:
+        options["language"] = language
+    if prompt:
+        options["prompt"] = prompt
+
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    duration = probe["duration"]
+
+    # Results of these parameters, or confident ones with another prompt (or language, when none is given)
+    chunk_store = ChunkStore()
+    params = chunk_store.register_params(model, options)
+    reusable = chunk_store.reusable_params(model, options)
+
+    # Files that fit in one upload are sent as they are; without ffmpeg there is no other option
+    fits = probe["size"] <= MAX_UPLOAD_BYTES and (duration is None or duration <= chunk_seconds)
+    if fits or not ffmpeg_available():
+        check_upload_size(probe["size"])
+        chunk_id = "file-" + file_digest(path)[:24]
+        result, other_params = chunk_store.lookup(chunk_id, params, reusable, language)
+        reused = result is not None
+        if result is None:
+            with open(path, "rb") as file:
+                result = transcribe_chunk(client, file, base_name + probe["extension"], model, options)
+            chunk_store.save_result(chunk_id, params, result)
+        if progress:
+            progress(1, 1)
+        stitched = stitch_results([result], [0.0])
+        stitched["chunks"] = {"total": 1, "reused": int(reused), "reused_other_params": int(other_params)}
+        return stitched
+
+    # Longer files are cut at pauses; chunks already transcribed from an earlier
+    # version of the audio (or an interrupted run) are reused from the chunk store
+    features = decode_features(path)
+    cuts = plan_cuts(features[0], min(MIN_CHUNK_SECONDS, chunk_seconds / 2), chunk_seconds)
+    chunks, starts = [], []
+    reused = reused_other_params = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        for index, (start_frame, end_frame) in enumerate(cuts):
+            start = start_frame * FRAME_SECONDS
+            chunk_id = chunk_store.identify(features, start_frame, end_frame)
+            result, other_params = chunk_store.lookup(chunk_id, params, reusable, language)
+            if result is None:
+                chunk_path = os.path.join(work_dir, f"{base_name}_{index:05d}.flac")
+                extract_chunk(path, start, (end_frame - start_frame) * FRAME_SECONDS, chunk_path)
+                with open(chunk_path, "rb") as file:
+                    result = transcribe_chunk(client, file, os.path.basename(chunk_path), model, options)
+                chunk_store.save_result(chunk_id, params, result)
+                os.unlink(chunk_path)
+            else:
+                reused += 1
+                reused_other_params += other_params
+
+            chunks.append(result)
+            starts.append(start)
+            if progress:
+                progress(index + 1, len(cuts))
+
+    stitched = stitch_results(chunks, starts)
+    stitched["chunks"] = {"total": len(cuts), "reused": reused, "reused_other_params": reused_other_params}
+    return stitched
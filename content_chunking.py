@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Content-defined chunking of decoded audio for incremental re-transcription.
+
+Long files are cut at pauses in the speech rather than at fixed offsets, so
+trimming an intro or appending a segment only moves the cuts near the edit:
+everywhere else the same pauses produce the same chunks. Each chunk is
+identified by a fingerprint of its loudness envelope together with the
+spectral shape of every second of sound, which both survive re-encoding and
+small shifts of the cut, and its transcript is stored under that identity.
+An edited re-upload then only sends the chunks whose audio actually changed
+and reuses the others at their new offsets. Chunks whose loudness barely
+varies (steady tones, noise, silence) carry too little of either to tell
+recordings apart, so they are identified by a checksum of their samples and
+only match the identical audio.
+
+Results are stored per set of transcription parameters. Retrying with only
+a different language or prompt reuses any chunk that an earlier run
+transcribed confidently, judged by the avg_logprob and no_speech_prob of its
+segments, and only re-sends the low-confidence chunks. When a language is
+given, only results in that language are taken from other runs.
+"""
+
+import os
+import json
+import hashlib
+import subprocess
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from languages import normalize_language
+
+SAMPLE_RATE = 16000
+
+# Loudness envelope resolution: one value per 10 ms of audio
+FRAME_SAMPLES = 160
+FRAME_SECONDS = FRAME_SAMPLES / SAMPLE_RATE
+
+# Fingerprints average the envelope over 100 ms bins
+BIN_FRAMES = 10
+
+# Octave bands of each frame's spectrum, as ranges of its 100 Hz FFT bins: 100 Hz
+# to 4.8 kHz, leaving out DC and the highs that lossy encoders cut
+BAND_EDGES = (1, 2, 4, 8, 16, 32, 48)
+
+# Spectral shapes are compared per second (in 100 ms bins)
+SHAPE_BINS = 10
+
+# Fixed odd multipliers of a frame's samples, summed modulo 2**64 into its checksum
+CHECKSUM_WEIGHTS = np.frombuffer(hashlib.shake_256(b"frame checksum").digest(FRAME_SAMPLES * 8), dtype="<i8") | 1
+
+# Frames quieter than this (dBFS) count as a pause
+SILENCE_DB = float(os.getenv("GROQ_SILENCE_DB", "-40"))
+
+# Digital silence is clamped so it does not dominate fingerprint differences
+FLOOR_DB = -60.0
+
+MIN_PAUSE_SECONDS = 0.3
+
+# A pause is cut at when it is the longest within this many seconds either side
+MIN_CHUNK_SECONDS = float(os.getenv("GROQ_MIN_CHUNK_SECONDS", "60"))
+
+# Below this window, over-long chunks without a usable pause are cut evenly
+MIN_WINDOW_SECONDS = 5.0
+
+# A stored chunk matches when durations agree and envelopes differ by at most
+# MATCH_TOLERANCE_DB on average and MATCH_MAX_DB in any 100 ms bin, so a word
+# edited in place is not hidden by an otherwise identical minute of audio
+MATCH_DURATION_SECONDS = 0.3
+MATCH_TOLERANCE_DB = 1.5
+MATCH_MAX_DB = 6.0
+
+# ...and the band levels of the seconds with sound in both, relative to each
+# second's mean level, differ by at most this much on average
+MATCH_SHAPE_DB = 2.0
+
+# Chunks whose 100 ms loudness varies less than this (standard deviation) only match exactly
+MIN_SPREAD_DB = 2.0
+
+# Cut positions may move by a few frames between two decodes of edited audio
+MAX_LAG_FRAMES = 5
+
+CHUNK_STORE_DIR = os.getenv("GROQ_CHUNK_STORE_DIR", os.path.join("transcripts", ".chunk_store"))
+
+# Options that only guide decoding: a confident result under other values is reused
+REUSABLE_OPTIONS = ("language", "prompt")
+
+# Whisper's own fallback thresholds: a segment decoded with a lower average
+# log-probability, or that is probably silence, is doubtful
+MIN_AVG_LOGPROB = float(os.getenv("GROQ_REUSE_MIN_LOGPROB", "-1.0"))
+MAX_NO_SPEECH_PROB = float(os.getenv("GROQ_REUSE_MAX_NO_SPEECH", "0.6"))
+
+# A chunk is low-confidence when doubtful segments cover more than this share of its speech
+MAX_DOUBTFUL_SHARE = float(os.getenv("GROQ_REUSE_MAX_DOUBTFUL_SHARE", "0.1"))
+
+
+def pcm_features(pcm: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Features of 16 kHz mono s16le PCM (a trailing partial frame is ignored)
+
+    Returns:
+        (envelope, bands, checksums): loudness in dBFS of each 10 ms frame, the
+        level in dB of each BAND_EDGES band per 100 ms bin (one row per bin, the
+        last one possibly shorter), and a 64-bit checksum of each frame's samples
+    """
+    usable = len(pcm) - len(pcm) % (FRAME_SAMPLES * 2)
+    pcm_frames = np.frombuffer(pcm[:usable], dtype=np.int16).reshape(-1, FRAME_SAMPLES)
+    if not len(pcm_frames):
+        return (np.zeros(0, dtype=np.float32), np.zeros((0, len(BAND_EDGES) - 1), dtype=np.float32),
+                np.zeros(0, dtype=np.int64))
+    checksums = pcm_frames.astype(np.int64) @ CHECKSUM_WEIGHTS
+    samples = pcm_frames.astype(np.float32) / 32768.0
+    envelope = 10 * np.log10(np.mean(np.square(samples), axis=1) + 1e-12)
+
+    power = np.square(np.abs(np.fft.rfft(samples, axis=1))) / FRAME_SAMPLES ** 2
+    bands = np.add.reduceat(power, BAND_EDGES[:-1], axis=1)
+    bin_starts = np.arange(0, len(bands), BIN_FRAMES)
+    bands = np.add.reduceat(bands, bin_starts, axis=0) / np.diff(bin_starts, append=len(bands))[:, None]
+    return (np.maximum(envelope, FLOOR_DB).astype(np.float32),
+            np.maximum(10 * np.log10(bands + 1e-12), FLOOR_DB).astype(np.float32), checksums)
+
+
+def decode_features(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode a file to 16 kHz mono with ffmpeg and return pcm_features() of the whole
+    file, reading the PCM in blocks so the decoded audio is never held whole
+    """
+    process = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+         "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # Whole 100 ms bins per block, so band rows never straddle two blocks
+    bin_bytes = FRAME_SAMPLES * BIN_FRAMES * 2
+    features, leftover = [], b""
+    while True:
+        block = process.stdout.read(bin_bytes * 100)
+        if not block:
+            break
+        block = leftover + block
+        usable = len(block) - len(block) % bin_bytes
+        leftover = block[usable:]
+        if usable:
+            features.append(pcm_features(block[:usable]))
+    features.append(pcm_features(leftover))
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg could not decode audio: {stderr.decode(errors='replace').strip()}")
+    return tuple(np.concatenate(parts) for parts in zip(*features))
+
+
+def find_pauses(envelope: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Centre frame and length in frames of every pause of at least MIN_PAUSE_SECONDS"""
+    silent = np.concatenate(([False], envelope < SILENCE_DB, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    lengths = ends - starts
+    keep = lengths >= int(MIN_PAUSE_SECONDS / FRAME_SECONDS)
+    return (starts[keep] + ends[keep]) // 2, lengths[keep]
+
+
+def local_maxima(centers: np.ndarray, lengths: np.ndarray, window: int) -> List[int]:
+    """
+    Centres of the pauses that are longer than every other pause within `window`
+    frames on either side (the earlier one wins a tie)
+    """
+    lo = np.searchsorted(centers, centers - window)
+    hi = np.searchsorted(centers, centers + window, side="right")
+    maxima = []
+    for i in range(len(centers)):
+        neighbours = lengths[lo[i]:hi[i]]
+        best = int(np.argmax(neighbours)) + lo[i]
+        if best == i:
+            maxima.append(int(centers[i]))
+    return maxima
+
+
+def _split(centers: np.ndarray, lengths: np.ndarray, start: int, end: int,
+           window: int, max_frames: int) -> List[Tuple[int, int]]:
+    if end - start <= max_frames:
+        return [(start, end)]
+
+    # Only pauses inside this span compete, and none within half a window of its edges
+    lo = np.searchsorted(centers, start + window // 2)
+    hi = np.searchsorted(centers, end - window // 2, side="right")
+    cuts = local_maxima(centers[lo:hi], lengths[lo:hi], window) if hi > lo else []
+    if not cuts:
+        if window // 2 >= int(MIN_WINDOW_SECONDS / FRAME_SECONDS):
+            return _split(centers, lengths, start, end, window // 2, max_frames)
+        # No usable pause at all: cut evenly
+        pieces = -(-(end - start) // max_frames)
+        edges = [start + (end - start) * k // pieces for k in range(pieces + 1)]
+        return list(zip(edges[:-1], edges[1:]))
+
+    edges = [start] + cuts + [end]
+    chunks = []
+    for piece_start, piece_end in zip(edges[:-1], edges[1:]):
+        chunks.extend(_split(centers, lengths, piece_start, piece_end, window // 2, max_frames))
+    return chunks
+
+
+def plan_cuts(envelope: np.ndarray, min_seconds: float = MIN_CHUNK_SECONDS,
+              max_seconds: float = 600.0) -> List[Tuple[int, int]]:
+    """
+    Split the envelope into (start_frame, end_frame) chunks at pauses
+
+    A pause becomes a cut when it is the longest one within min_seconds on
+    either side, so chunks are usually at least min_seconds long. Chunks
+    longer than max_seconds are split again the same way with half the window,
+    and evenly when they contain no pause. Whether a pause is a cut only
+    depends on the audio around it, never on where the previous cut fell, so
+    two versions of an edited file share every cut away from the edit.
+
+    Returns:
+        List of (start_frame, end_frame) pairs covering the whole envelope
+    """
+    centers, lengths = find_pauses(envelope)
+    return _split(centers, lengths, 0, len(envelope),
+                  int(min_seconds / FRAME_SECONDS), int(max_seconds / FRAME_SECONDS))
+
+
+def fingerprint(envelope: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Mean loudness of a chunk over 100 ms bins"""
+    start, end = max(0, start), min(len(envelope), end)
+    usable = (end - start) - (end - start) % BIN_FRAMES
+    if usable <= 0:
+        return np.asarray([envelope[start:end].mean() if end > start else FLOOR_DB], dtype=np.float32)
+    return envelope[start:start + usable].reshape(-1, BIN_FRAMES).mean(axis=1)
+
+
+def spectral_shape(envelope: np.ndarray, bands: np.ndarray, start: int, end: int) -> np.ndarray:
+    """
+    Band levels of each second of a chunk relative to that second's mean level,
+    NaN for seconds whose loudness is below SILENCE_DB (their shape is only noise)
+    """
+    first = min(max(0, round(start / BIN_FRAMES)), len(bands))
+    last = min(max(first, round(end / BIN_FRAMES)), len(bands))
+    if last == first:
+        return np.zeros((0, bands.shape[1]), dtype=np.float32)
+    rows = np.arange(first, last, SHAPE_BINS)
+    seconds = np.add.reduceat(bands[first:last], rows - first, axis=0) / np.diff(rows, append=last)[:, None]
+    shape = seconds - seconds.mean(axis=1, keepdims=True)
+    loudness = np.asarray([envelope[row * BIN_FRAMES:(row + SHAPE_BINS) * BIN_FRAMES].mean() for row in rows])
+    shape[loudness < SILENCE_DB] = np.nan
+    return shape.astype(np.float32)
+
+
+def shapes_match(shape: np.ndarray, stored: np.ndarray) -> bool:
+    """Whether two spectral_shape() results agree within MATCH_SHAPE_DB over the seconds with sound in both"""
+    overlap = min(len(shape), len(stored))
+    difference = np.abs(shape[:overlap] - stored[:overlap])
+    sounding = ~np.isnan(difference).any(axis=1)
+    return bool(sounding.any()) and float(difference[sounding].mean()) <= MATCH_SHAPE_DB
+
+
+def params_key(model: str, options: Dict[str, Any]) -> str:
+    """Key for every transcription parameter that changes a chunk's result"""
+    params = json.dumps({"model": model, "options": options}, sort_keys=True)
+    return hashlib.sha256(params.encode()).hexdigest()[:16]
+
+
+def segment_doubtful(segment: Dict[str, Any]) -> bool:
+    """Whether a verbose_json segment was decoded with low confidence (or does not say)"""
+    avg_logprob = segment.get("avg_logprob")
+    no_speech_prob = segment.get("no_speech_prob")
+    if avg_logprob is None or no_speech_prob is None:
+        return True
+    return avg_logprob < MIN_AVG_LOGPROB or no_speech_prob > MAX_NO_SPEECH_PROB
+
+
+def low_confidence(result: Dict[str, Any]) -> bool:
+    """Whether a chunk's result should be transcribed again when the parameters change"""
+    segments = result.get("segments") or []
+    lengths = [max(segment["end"] - segment["start"], 0.0) for segment in segments]
+    doubtful = [length for segment, length in zip(segments, lengths) if segment_doubtful(segment)]
+    if not sum(lengths):
+        return bool(doubtful)
+    return sum(doubtful) > MAX_DOUBTFUL_SHARE * sum(lengths)
+
+
+def confidence(result: Dict[str, Any]) -> float:
+    """Mean avg_logprob of a result's segments, weighted by their length"""
+    segments = [segment for segment in result.get("segments") or [] if segment.get("avg_logprob") is not None]
+    weights = [max(segment["end"] - segment["start"], 1e-3) for segment in segments]
+    if not segments:
+        return 0.0
+    return sum(segment["avg_logprob"] * weight for segment, weight in zip(segments, weights)) / sum(weights)
+
+
+def write_json(path: str, data: Any, **kwargs) -> None:
+    """Write JSON through a temporary file of its own, so concurrent writers of one path never collide"""
+    # Not mkstemp(), whose files are private to the user; the store may be shared
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(data, f, **kwargs)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class ChunkStore:
+    """
+    Transcripts of audio chunks, identified by loudness fingerprint and spectral
+    shape and stored per set of transcription parameters
+    """
+
+    def __init__(self, root: str = CHUNK_STORE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.jsonl")
+        os.makedirs(root, exist_ok=True)
+        self.entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A crash mid-append leaves at most one truncated line
+                        continue
+                    if "shape" not in entry:
+                        # Indexed before spectral shapes were recorded: cannot be told apart safely
+                        continue
+                    self.entries.append((entry["id"], entry["duration"],
+                                         np.asarray(entry["fingerprint"], dtype=np.float32) / 10,
+                                         np.asarray(entry["shape"], dtype=np.float32) / 10))
+
+    def identify(self, features: Tuple[np.ndarray, np.ndarray, np.ndarray], start: int, end: int) -> str:
+        """
+        Return the id of a stored chunk with the same audio, registering a new one if there is none
+
+        Args:
+            features: (envelope, bands, checksums) of the whole file from decode_features()
+            start: First frame of the chunk
+            end: Frame after its last one
+        """
+        envelope, bands, checksums = features
+        duration = (end - start) * FRAME_SECONDS
+        shape = spectral_shape(envelope, bands, start, end)
+        if fingerprint(envelope, start, end).std() < MIN_SPREAD_DB or np.isnan(shape).all():
+            # Steady or quiet audio looks alike in every recording: only the same samples match
+            return "exact-" + hashlib.sha256(checksums[start:end].tobytes()).hexdigest()[:24]
+
+        candidates = [(chunk_id, bins, stored_shape) for chunk_id, stored_duration, bins, stored_shape in self.entries
+                      if abs(stored_duration - duration) <= MATCH_DURATION_SECONDS]
+        if candidates:
+            for lag in range(-MAX_LAG_FRAMES, MAX_LAG_FRAMES + 1):
+                bins = fingerprint(envelope, start + lag, end + lag)
+                for chunk_id, stored, stored_shape in candidates:
+                    overlap = min(len(bins), len(stored))
+                    difference = np.abs(bins[:overlap] - stored[:overlap])
+                    if (difference.mean() <= MATCH_TOLERANCE_DB and difference.max() <= MATCH_MAX_DB
+                            and shapes_match(shape, stored_shape)):
+                        return chunk_id
+
+        bins = np.round(fingerprint(envelope, start, end) * 10).astype(np.int16)
+        chunk_id = hashlib.sha256(bins.tobytes() + f"{duration:.2f}".encode()).hexdigest()[:24]
+        # Quiet seconds are stored as null
+        stored_shape = [[None if np.isnan(level) else int(round(level * 10)) for level in row] for row in shape]
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps({"id": chunk_id, "duration": duration, "fingerprint": bins.tolist(),
+                                "shape": stored_shape}) + "\n")
+        self.entries.append((chunk_id, duration, bins.astype(np.float32) / 10,
+                             np.asarray(stored_shape, dtype=np.float32) / 10))
+        return chunk_id
+
+    def _result_path(self, chunk_id: str, params: str) -> str:
+        return os.path.join(self.root, "results", params, f"{chunk_id}.json")
+
+    def register_params(self, model: str, options: Dict[str, Any]) -> str:
+        """params_key() of a parameter set, recording the parameters so other runs can find its results"""
+        params = params_key(model, options)
+        description = os.path.join(self.root, "results", params, "params.json")
+        if not os.path.exists(description):
+            os.makedirs(os.path.dirname(description), exist_ok=True)
+            write_json(description, {"model": model, "options": options}, sort_keys=True)
+        return params
+
+    def _load_params(self, params: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.root, "results", params, "params.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def reusable_params(self, model: str, options: Dict[str, Any]) -> List[str]:
+        """Other registered parameter sets that differ from these only in REUSABLE_OPTIONS"""
+        fixed = {key: value for key, value in options.items() if key not in REUSABLE_OPTIONS}
+        own = params_key(model, options)
+        matches = []
+        results_dir = os.path.join(self.root, "results")
+        for params in sorted(os.listdir(results_dir)) if os.path.isdir(results_dir) else []:
+            description = self._load_params(params)
+            if description is None:
+                continue
+            other = {key: value for key, value in description["options"].items() if key not in REUSABLE_OPTIONS}
+            if params != own and description["model"] == model and other == fixed:
+                matches.append(params)
+        return matches
+
+    def lookup(self, chunk_id: str, params: str, reusable: List[str],
+               language: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Stored result for a chunk: the one for these parameters, or else the most
+        confident of the results under `reusable` parameters that is not low-confidence
+
+        Args:
+            chunk_id: Chunk to look up
+            params: params_key() of this request
+            reusable: reusable_params() of this request
+            language: Language asked for (code or name); results from other runs
+                in another language, or that do not report one, are not reused.
+                Without one, only results of runs that also detected the
+                language are reused, never those of runs forced to a language
+
+        Returns:
+            (result or None, whether it was transcribed with other parameters)
+        """
+        result = self.load_result(chunk_id, params)
+        if result is not None:
+            return result, False
+        wanted = normalize_language(language)
+        if wanted is None:
+            # Runs forced to a language transcribe speech in any other language into theirs
+            descriptions = [(other, self._load_params(other)) for other in reusable]
+            reusable = [other for other, description in descriptions
+                        if description and not description["options"].get("language")]
+        candidates = [self.load_result(chunk_id, other) for other in reusable]
+        candidates = [candidate for candidate in candidates
+                      if candidate is not None and not low_confidence(candidate)
+                      and (wanted is None or normalize_language(candidate.get("language")) == wanted)]
+        if not candidates:
+            return None, False
+        return max(candidates, key=confidence), True
+
+    def load_result(self, chunk_id: str, params: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._result_path(chunk_id, params), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_result(self, chunk_id: str, params: str, result: Dict[str, Any]) -> None:
+        target = self._result_path(chunk_id, params)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        write_json(target, result, default=str)
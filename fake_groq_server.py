@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Groq transcription endpoint for benchmarks and load tests.
+
+Accepts the same multipart upload as POST /openai/v1/audio/transcriptions and
+answers with a synthetic verbose_json transcription whose segments and words
+cover the uploaded audio's duration. GET requests serve files from a static
+directory, with ETag / Last-Modified validation and byte ranges, so URL-based
+tools and their download cache can be exercised too. GET /openai/v1/models
+answers with a short model list.
+
+Connections are kept alive (HTTP/1.1). To mimic a remote API, each new
+connection can be delayed by --connect-latency (standing in for DNS, TCP and
+TLS setup) and idle connections closed after --idle-timeout seconds, as load
+balancers do.
+
+Point the Groq client at it with GROQ_BASE_URL:
+
+    python fake_groq_server.py --port 8000 --latency 0.3
+    GROQ_BASE_URL=http://127.0.0.1:8000 GROQ_API_KEY=fake python mcp_server.py
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import mimetypes
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from audio_probe import AudioProbeError, probe_audio
+
+# Fallback when an upload cannot be probed: 16 kHz mono 16-bit PCM
+BYTES_PER_SECOND = 32000
+
+
+def build_transcription(duration: float, words_per_second: float = 2.5,
+                        segment_seconds: float = 4.0, seed: int = 0) -> Dict[str, Any]:
+    """Synthetic verbose_json response covering `duration` seconds of speech"""
+    rng = random.Random(seed)
+    word_count = int(duration * words_per_second)
+    step = duration / word_count if word_count else 0.0
+    words = [
+        {"word": f"word{i % 1000}", "start": round(i * step, 3), "end": round(i * step + step * 0.8, 3)}
+        for i in range(word_count)
+    ]
+
+    segments = []
+    per_segment = max(1, int(segment_seconds * words_per_second))
+    for index, first in enumerate(range(0, word_count, per_segment)):
+        chunk = words[first:first + per_segment]
+        segments.append({
+            "id": index,
+            "seek": 0,
+            "start": chunk[0]["start"],
+            "end": chunk[-1]["end"],
+            "text": " " + " ".join(word["word"] for word in chunk),
+            "tokens": [],
+            "temperature": 0.0,
+            "avg_logprob": round(-rng.uniform(0.05, 0.6), 4),
+            "compression_ratio": 1.5,
+            "no_speech_prob": round(rng.uniform(0.0, 0.2), 4),
+        })
+
+    return {
+        "task": "transcribe",
+        "language": "English",
+        "duration": duration,
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "words": words,
+        "x_groq": {"id": f"req_fake_{seed}"},
+    }
+
+
+def upload_duration(body: bytes, content_type: str) -> float:
+    """Duration of the audio file part of a multipart upload"""
+    boundary = content_type.split("boundary=")[-1].strip('"').encode()
+    for part in body.split(b"--" + boundary):
+        header_end = part.find(b"\r\n\r\n")
+        if header_end == -1 or b"filename=" not in part[:header_end]:
+            continue
+        data = part[header_end + 4:-2]
+        with tempfile.NamedTemporaryFile() as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            try:
+                duration = probe_audio(temp_file.name)["duration"]
+            except AudioProbeError:
+                duration = None
+        return duration if duration else len(data) / BYTES_PER_SECOND
+    return len(body) / BYTES_PER_SECOND
+
+
+class FakeGroqHandler(SimpleHTTPRequestHandler):
+    """Transcription endpoint plus static file serving"""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    connect_latency = 0.0
+    words_per_second = 2.5
+    requests_served = 0
+    bytes_downloaded = 0
+    connections_opened = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        # StreamRequestHandler applies `timeout` to the socket: idle connections are closed after it
+        super().setup()
+        with FakeGroqHandler.lock:
+            FakeGroqHandler.connections_opened += 1
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            payload = json.dumps({"object": "list", "data": [
+                {"id": model, "object": "model", "created": 0, "owned_by": "fake"}
+                for model in ("whisper-large-v3-turbo", "whisper-large-v3")
+            ]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            super().do_GET()
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+        last_modified = self.date_time_string(int(stat.st_mtime))
+        if "If-None-Match" in self.headers:
+            # If-None-Match takes precedence over If-Modified-Since
+            not_modified = etag in self.headers["If-None-Match"]
+        else:
+            not_modified = self.headers.get("If-Modified-Since") == last_modified
+        if not_modified:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        status = 200
+        byte_range = self.headers.get("Range", "")
+        if byte_range.startswith("bytes=") and self.headers.get("If-Range", etag) in (etag, last_modified):
+            first, _, last = byte_range[len("bytes="):].partition("-")
+            if first.isdigit() and int(first) < size:
+                start = int(first)
+                end = min(int(last), size - 1) if last.isdigit() else size - 1
+                status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                block = f.read(min(remaining, 64 * 1024))
+                if not block:
+                    break
+                try:
+                    self.wfile.write(block)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client rejected the file (e.g. over the size limit) and hung up
+                    self.close_connection = True
+                    return
+                remaining -= len(block)
+        with FakeGroqHandler.lock:
+            FakeGroqHandler.bytes_downloaded += end - start + 1
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/audio/transcriptions"):
+            # The unread body would be taken for the next request on this connection
+            self.close_connection = True
+            self.send_error(404)
+            return
+
+        body = self._read_body()
+        duration = upload_duration(body, self.headers.get("Content-Type", ""))
+        with FakeGroqHandler.lock:
+            FakeGroqHandler.requests_served += 1
+            seed = FakeGroqHandler.requests_served
+        if self.latency:
+            time.sleep(self.latency)
+
+        payload = json.dumps(build_transcription(duration, self.words_per_second, seed=seed)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_fake_server(port: int = 0, latency: float = 0.0, directory: Optional[str] = None,
+                      words_per_second: float = 2.5, connect_latency: float = 0.0,
+                      idle_timeout: Optional[float] = None) -> ThreadingHTTPServer:
+    """Run the fake API in a background thread; the URL is server_url(server)"""
+    directory = directory or os.getcwd()
+
+    class Handler(FakeGroqHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+    Handler.latency = latency
+    Handler.words_per_second = words_per_second
+    Handler.connect_latency = connect_latency
+    Handler.timeout = idle_timeout
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Groq transcription API for local testing")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (0 picks a free one)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--static-dir", help="Directory served for GET requests (default: current)")
+    parser.add_argument("--words-per-second", type=float, default=2.5, help="Speech rate of the fake transcript")
+    parser.add_argument("--connect-latency", type=float, default=0.0,
+                        help="Seconds added to the first request of each new connection")
+    parser.add_argument("--idle-timeout", type=float, help="Close connections idle for this many seconds")
+    args = parser.parse_args()
+
+    server = start_fake_server(args.port, args.latency, args.static_dir, args.words_per_second,
+                               args.connect_latency, args.idle_timeout)
+    # The first line is read by benchmarks that start the server as a subprocess
+    print(server_url(server), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Durable SQLite job queue shared by the web UI, the MCP server and workers.
+
+Frontends enqueue transcription jobs and wait for their results; any number
+of worker processes (worker.py) claim jobs and run them. A claimed job stays
+invisible to other workers for a visibility timeout, which the worker keeps
+extending while it works. If a worker dies, its job becomes visible again
+once the timeout runs out and another worker picks it up, so every job is
+delivered at least once. Results and errors are stored with the job until a
+frontend reads them. A frontend that gives up waiting after
+GROQ_JOB_WAIT_SECONDS cancels the job, since it deletes the audio file the
+job points to; cancelled jobs are never claimed and their results are dropped.
+
+The queue is off by default and frontends transcribe in-process; set
+GROQ_JOB_QUEUE=1 and start worker.py to move transcription into workers.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from audio_probe import AudioProbeError, probe_audio
+from chunked_transcription import transcribe_long_audio
+from scheduler import (
+    ANONYMOUS_CLIENT, PRIORITY_CLASSES, current_client, estimate_cost,
+    pick_next, priority_class, scheduler, wait_summary,
+)
+
+JOB_QUEUE_ENABLED = os.getenv("GROQ_JOB_QUEUE", "0").lower() in ("1", "true", "yes")
+
+JOB_DB_PATH = os.getenv("GROQ_JOB_DB", os.path.join("transcripts", "jobs.sqlite3"))
+
+# A claimed job is handed to another worker if not extended within this time
+VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("GROQ_JOB_VISIBILITY_SECONDS", "120"))
+
+# Deliveries before a job is marked failed
+MAX_ATTEMPTS = int(os.getenv("GROQ_JOB_MAX_ATTEMPTS", "5"))
+
+# Delay before a failed attempt is retried, doubled with every attempt
+RETRY_DELAY_SECONDS = 2.0
+
+# Finished jobs are deleted after this long
+RESULT_TTL_SECONDS = float(os.getenv("GROQ_JOB_RESULT_TTL_SECONDS", str(24 * 3600)))
+
+# Frontends stop waiting for a job, and cancel it, after this long
+JOB_WAIT_SECONDS = float(os.getenv("GROQ_JOB_WAIT_SECONDS", "3600"))
+
+POLL_SECONDS = 0.2
+
+# Oldest visible jobs considered by the scheduling policy on each claim
+CLAIM_CANDIDATES = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    visible_at REAL NOT NULL,
+    lease TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    cost REAL NOT NULL DEFAULT 0,
+    client TEXT NOT NULL DEFAULT 'anonymous',
+    wait_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, visible_at, created_at);
+"""
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = {
+    "cost": "ALTER TABLE jobs ADD COLUMN cost REAL NOT NULL DEFAULT 0",
+    "client": "ALTER TABLE jobs ADD COLUMN client TEXT NOT NULL DEFAULT 'anonymous'",
+    "wait_seconds": "ALTER TABLE jobs ADD COLUMN wait_seconds REAL",
+}
+
+
+class JobFailed(RuntimeError):
+    """A job ended in the failed state; the message is the worker's error"""
+
+
+class JobQueue:
+    """Jobs stored in one SQLite database; safe to use from many processes"""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, statement in MIGRATIONS.items():
+                if column not in columns:
+                    db.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        # Autocommit connections; claim() opens its own write transaction
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], cost: float = 0.0,
+                client: str = ANONYMOUS_CLIENT) -> str:
+        """Add a job and return its id; cost and client decide when it is claimed (see scheduler.py)"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, visible_at, created_at, cost, client) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now, cost, client),
+            )
+            db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                       (now - RESULT_TTL_SECONDS,))
+        return job_id
+
+    def claim(self, worker: str, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS) -> Optional[Dict[str, Any]]:
+        """
+        Take the next visible job in scheduler.pick_next() order: a queued one,
+        or a running one whose worker stopped extending it. Returns the job with
+        a lease token, or None.
+        """
+        with self._connect() as db:
+            while True:
+                now = time.time()
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    candidates = db.execute(
+                        "SELECT * FROM jobs WHERE status IN ('queued', 'running') AND visible_at <= ? "
+                        "ORDER BY created_at LIMIT ?",
+                        (now, CLAIM_CANDIDATES),
+                    ).fetchall()
+                    running = dict(db.execute(
+                        "SELECT client, COUNT(*) FROM jobs WHERE status = 'running' AND visible_at > ? GROUP BY client",
+                        (now,),
+                    ).fetchall())
+                    index = pick_next(
+                        [{"cost": row["cost"], "client": row["client"], "enqueued_at": row["created_at"]}
+                         for row in candidates],
+                        running, now,
+                    )
+                    if index is None:
+                        db.execute("COMMIT")
+                        return None
+                    row = candidates[index]
+                    if row["attempts"] >= MAX_ATTEMPTS:
+                        # Its last worker died too: give up on it and look for the next job
+                        db.execute(
+                            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease = NULL WHERE id = ?",
+                            (row["error"] or f"Gave up after {row['attempts']} attempts", now, row["id"]),
+                        )
+                        db.execute("COMMIT")
+                        continue
+
+                    lease = uuid.uuid4().hex
+                    db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, visible_at = ?, lease = ?, "
+                        "worker = ?, started_at = ?, wait_seconds = COALESCE(wait_seconds, ? - created_at) "
+                        "WHERE id = ?",
+                        (now + visibility_timeout, lease, worker, now, now, row["id"]),
+                    )
+                    db.execute("COMMIT")
+                    break
+                except BaseException:
+                    if db.in_transaction:
+                        db.execute("ROLLBACK")
+                    raise
+
+        job = dict(row)
+        job.update(payload=json.loads(row["payload"]), lease=lease, attempts=row["attempts"] + 1, status="running")
+        return job
+
+    def extend(self, job_id: str, lease: str, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS) -> bool:
+        """Keep a claimed job invisible; False when the lease was lost to another worker"""
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET visible_at = ? WHERE id = ? AND lease = ? AND status = 'running'",
+                (time.time() + visibility_timeout, job_id, lease),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, lease: str, result: Any) -> bool:
+        """Store a job's result; ignored (False) when another delivery already owns the job"""
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, lease = NULL "
+                "WHERE id = ? AND lease = ? AND status = 'running'",
+                (json.dumps(result, default=str), time.time(), job_id, lease),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, lease: str, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt, retrying later with backoff unless retry is False or attempts ran out"""
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT attempts FROM jobs WHERE id = ? AND lease = ? AND status = 'running'",
+                             (job_id, lease)).fetchone()
+            if row is None:
+                return False
+            if retry and row["attempts"] < MAX_ATTEMPTS:
+                delay = RETRY_DELAY_SECONDS * 2 ** (row["attempts"] - 1)
+                db.execute("UPDATE jobs SET status = 'queued', error = ?, visible_at = ?, lease = NULL "
+                           "WHERE id = ? AND lease = ?", (error, now + delay, job_id, lease))
+            else:
+                db.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease = NULL "
+                           "WHERE id = ? AND lease = ?", (error, now, job_id, lease))
+        return True
+
+    def cancel(self, job_id: str, reason: str) -> bool:
+        """
+        Stop a job that has not finished: it is no longer claimed, and a worker still
+        running it loses its lease, so its result is dropped. False when it already finished.
+        """
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'cancelled', error = ?, finished_at = ?, lease = NULL "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (reason, time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job, with its result decoded once it is done"""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(row["payload"])
+        job["result"] = json.loads(row["result"]) if row["result"] is not None else None
+        return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Any:
+        """
+        Block until a job finishes and return its result
+
+        Raises:
+            JobFailed: The job failed for good or was cancelled
+            TimeoutError: It did not finish within timeout seconds
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                raise KeyError(f"Unknown job {job_id}")
+            if job["status"] == "done":
+                return job["result"]
+            if job["status"] in ("failed", "cancelled"):
+                raise JobFailed(job["error"])
+            if deadline is not None and time.time() >= deadline:
+                raise TimeoutError(f"Job {job_id} still {job['status']} after {timeout} seconds")
+            time.sleep(POLL_SECONDS)
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def wait_stats(self) -> Dict[str, Any]:
+        """Queue wait statistics (time from enqueue to first claim) and queue length per priority class"""
+        with self._connect() as db:
+            rows = db.execute("SELECT status, cost, wait_seconds FROM jobs").fetchall()
+        classes = {}
+        for name, _ in PRIORITY_CLASSES:
+            in_class = [row for row in rows if priority_class(row["cost"]) == name]
+            summary = wait_summary([row["wait_seconds"] for row in in_class if row["wait_seconds"] is not None])
+            summary["waiting"] = sum(1 for row in in_class if row["status"] == "queued")
+            classes[name] = summary
+        return {"running": sum(1 for row in rows if row["status"] == "running"), "classes": classes}
+
+
+def run_transcription(client, path: str, model: str = "whisper-large-v3-turbo",
+                      language: Optional[str] = None, prompt: Optional[str] = None,
+                      probe: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Transcribe a local file through the job queue when it is enabled, otherwise in this
+    process; either way requests are ordered by scheduler.pick_next()
+
+    Args:
+        client: Groq client, used only when transcribing in-process
+        path: Local audio file, readable by the workers
+        model: Whisper model to use
+        language: Optional language code
+        prompt: Optional context or spelling prompt
+        probe: audio_probe.probe_audio() result of the file
+
+    Returns:
+        transcribe_long_audio() result
+    """
+    probe = probe or probe_audio(path)
+    cost = estimate_cost(probe)
+    if not JOB_QUEUE_ENABLED:
+        # Shortest jobs first, with a fair share of the slots for every client
+        with scheduler.slot(cost):
+            return transcribe_long_audio(client, path, model=model, language=language, prompt=prompt, probe=probe)
+
+    queue = JobQueue()
+    job_id = queue.enqueue("transcribe", {
+        "path": os.path.abspath(path), "model": model, "language": language, "prompt": prompt,
+    }, cost=cost, client=current_client.get())
+    try:
+        return queue.wait(job_id, timeout=JOB_WAIT_SECONDS)
+    except TimeoutError:
+        # The caller deletes the file once this returns; no worker may start on it afterwards
+        if queue.cancel(job_id, f"Cancelled after waiting {JOB_WAIT_SECONDS:g} seconds"):
+            raise
+        # It finished between the last poll and the cancel
+        return queue.wait(job_id, timeout=0)
+
+
+def queue_stats() -> Dict[str, Any]:
+    """Queue wait per priority class for whichever mode transcriptions run in"""
+    if JOB_QUEUE_ENABLED:
+        return {"mode": "job_queue", **JobQueue().wait_stats()}
+    return {"mode": "in_process", **scheduler.stats()}
+
+
+def handle_job(client, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one claimed job; raises AudioProbeError for inputs that no retry can fix"""
+    if job["kind"] != "transcribe":
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+    payload = job["payload"]
+    if not os.path.exists(payload["path"]):
+        raise AudioProbeError(f"Audio file no longer exists: {payload['path']}")
+    return transcribe_long_audio(client, payload["path"], model=payload["model"],
+                                 language=payload["language"], prompt=payload["prompt"])
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Whisper's languages, by ISO-639-1 code (or ISO-639-3 where there is none).
+
+Requests name the language by code ("es"), while verbose_json results report
+it by name ("spanish"); normalize_language() maps either to the name so the
+two can be compared.
+"""
+
+from typing import Optional
+
+LANGUAGES = {
+    "en": "english", "zh": "chinese", "de": "german", "es": "spanish", "ru": "russian",
+    "ko": "korean", "fr": "french", "ja": "japanese", "pt": "portuguese", "tr": "turkish",
+    "pl": "polish", "ca": "catalan", "nl": "dutch", "ar": "arabic", "sv": "swedish",
+    "it": "italian", "id": "indonesian", "hi": "hindi", "fi": "finnish", "vi": "vietnamese",
+    "he": "hebrew", "uk": "ukrainian", "el": "greek", "ms": "malay", "cs": "czech",
+    "ro": "romanian", "da": "danish", "hu": "hungarian", "ta": "tamil", "no": "norwegian",
+    "th": "thai", "ur": "urdu", "hr": "croatian", "bg": "bulgarian", "lt": "lithuanian",
+    "la": "latin", "mi": "maori", "ml": "malayalam", "cy": "welsh", "sk": "slovak",
+    "te": "telugu", "fa": "persian", "lv": "latvian", "bn": "bengali", "sr": "serbian",
+    "az": "azerbaijani", "sl": "slovenian", "kn": "kannada", "et": "estonian", "mk": "macedonian",
+    "br": "breton", "eu": "basque", "is": "icelandic", "hy": "armenian", "ne": "nepali",
+    "mn": "mongolian", "bs": "bosnian", "kk": "kazakh", "sq": "albanian", "sw": "swahili",
+    "gl": "galician", "mr": "marathi", "pa": "punjabi", "si": "sinhala", "km": "khmer",
+    "sn": "shona", "yo": "yoruba", "so": "somali", "af": "afrikaans", "oc": "occitan",
+    "ka": "georgian", "be": "belarusian", "tg": "tajik", "sd": "sindhi", "gu": "gujarati",
+    "am": "amharic", "yi": "yiddish", "lo": "lao", "uz": "uzbek", "fo": "faroese",
+    "ht": "haitian creole", "ps": "pashto", "tk": "turkmen", "nn": "nynorsk", "mt": "maltese",
+    "sa": "sanskrit", "lb": "luxembourgish", "my": "myanmar", "bo": "tibetan", "tl": "tagalog",
+    "mg": "malagasy", "as": "assamese", "tt": "tatar", "haw": "hawaiian", "ln": "lingala",
+    "ha": "hausa", "ba": "bashkir", "jw": "javanese", "su": "sundanese", "yue": "cantonese",
+}
+
+# Other names Whisper accepts for some of these languages
+ALIASES = {
+    "burmese": "myanmar", "valencian": "catalan", "flemish": "dutch", "haitian": "haitian creole",
+    "letzeburgesch": "luxembourgish", "pushto": "pashto", "panjabi": "punjabi", "moldavian": "romanian",
+    "moldovan": "romanian", "sinhalese": "sinhala", "castilian": "spanish", "mandarin": "chinese",
+}
+
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """Lower-case language name for a code or name; unknown values are only lower-cased"""
+    if not language:
+        return None
+    language = language.strip().lower()
+    return LANGUAGES.get(language) or ALIASES.get(language, language)
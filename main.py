@@ -1,38 +1,214 @@
+#!/usr/bin/env python3
+"""
+Batch transcription CLI
+
+Transcribes audio files found in directories, given on the command line or
+listed in a manifest, using a pool of worker threads. Completed files are
+recorded in transcripts/manifest.jsonl so reruns skip finished work.
+
+Examples:
+    python main.py audio.m4a
+    python main.py recordings/ --workers 8
+    python main.py --manifest nightly.txt --language en
+"""
+
 import os
+import sys
 import json
-from groq import Groq
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from api_client import create_client, start_warm_pool
+from audio_probe import FORMAT_EXTENSIONS, preflight_audio
+from chunked_transcription import max_input_bytes, transcribe_long_audio
+from wire_format import format_timestamp
 
 load_dotenv()
-os.makedirs("transcripts", exist_ok=True)
-
-
-# Initialize the Groq client
-client = Groq()
-
-# Specify the path to the audio file
-filename = os.path.dirname(__file__) + "/audio.m4a" # Replace with your audio file!
-
-# Open the audio file
-with open(filename, "rb") as file:
-    # Create a transcription of the audio file
-    transcription = client.audio.transcriptions.create(
-      file=file, # Required audio file
-      model="whisper-large-v3-turbo", # Required model to use for transcription
-      prompt="Specify context or spelling",  # Optional
-      response_format="verbose_json",  # Optional
-      timestamp_granularities = ["word", "segment"], # Optional (must set response_format to "json" to use and can specify "word", "segment" (default), or both)
-      language="en",  # Optional
-      temperature=0.0  # Optional
-    )
-
-with open(f"transcripts/{filename.split('/')[-1].split('.')[0]}.txt", "w") as f:
-
-  segments= transcription.to_dict()["segments"]
-  for i, segment in enumerate(transcription.segments):
-      start_time = segment["start"]
-      end_time = segment["end"]
-      start_formatted = f"{int(start_time//60):02d}:{start_time%60:05.2f}"
-      end_formatted = f"{int(end_time//60):02d}:{end_time%60:05.2f}"
-      f.write(f"{start_formatted} - {end_formatted} {segment['text']}\n")
-    
\ No newline at end of file
+
+TRANSCRIPTS_DIR = "transcripts"
+MANIFEST_PATH = os.path.join(TRANSCRIPTS_DIR, "manifest.jsonl")
+
+# Extensions picked up when walking directories
+AUDIO_EXTENSIONS = set(FORMAT_EXTENSIONS.values()) | {".mp4", ".m4b", ".mpeg", ".mpga", ".oga", ".opus"}
+
+
+def find_audio_files(paths, manifest_file=None):
+    """Expand files, directories and an optional manifest of paths into a sorted file list"""
+    candidates = list(paths)
+    if manifest_file:
+        with open(manifest_file, "r") as f:
+            candidates.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    files = set()
+    for path in candidates:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in names:
+                    if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                        files.add(os.path.abspath(os.path.join(root, name)))
+        elif os.path.isfile(path):
+            files.add(os.path.abspath(path))
+        else:
+            print(f"⚠️  Skipping missing path: {path}")
+    return sorted(files)
+
+
+def output_names(files):
+    """
+    Map each file to its transcript name, keeping transcripts/{name}.txt where the
+    name is unique in the batch and adding the extension, then the parent folder,
+    then a short hash of the full path to tell apart files that would otherwise
+    overwrite each other
+    """
+    def stem(path, level):
+        name = os.path.basename(path)
+        if level == 0:
+            return os.path.splitext(name)[0]
+        if level == 1:
+            return name
+        parent_name = f"{os.path.basename(os.path.dirname(path))}_{name}"
+        if level == 2:
+            return parent_name
+        # Derived from the path so reruns keep writing to the same transcript
+        return f"{parent_name}_{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+
+    names = {}
+    for level in range(4):
+        counts = {}
+        for path in files:
+            counts[stem(path, level)] = counts.get(stem(path, level), 0) + 1
+        for path in files:
+            if path not in names and (counts[stem(path, level)] == 1 or level == 3):
+                names[path] = stem(path, level)
+    return names
+
+
+def file_key(path):
+    """Identify a file version so edited files are transcribed again"""
+    stat = os.stat(path)
+    return f"{path}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def load_completed(manifest_path=MANIFEST_PATH):
+    """Read the keys of files already transcribed by earlier runs"""
+    completed = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            for line in f:
+                try:
+                    completed.add(json.loads(line)["key"])
+                except (ValueError, KeyError):
+                    # Tolerate a truncated last line from an interrupted run
+                    continue
+    return completed
+
+
+def transcribe_file(client, path, model, language=None, prompt=None, output_name=None):
+    """Transcribe one file and write transcripts/{name}.txt, returning its manifest record"""
+    probe = preflight_audio(path, max_bytes=max_input_bytes())
+    output_name = output_name or os.path.splitext(os.path.basename(path))[0]
+
+    def progress(done, total):
+        if total != 1:
+            print(f"   {output_name}: chunk {done}/{total or '?'}")
+
+    # Long files are sent in checkpointed chunks, so a rerun after a crash resumes mid-file
+    transcription = transcribe_long_audio(client, path, model=model, language=language,
+                                          prompt=prompt, probe=probe, progress=progress)
+
+    output_path = os.path.join(TRANSCRIPTS_DIR, f"{output_name}.txt")
+    with open(output_path, "w") as f:
+        for segment in transcription["segments"]:
+            f.write(f"{format_timestamp(segment['start'])} - {format_timestamp(segment['end'])} {segment['text']}\n")
+
+    return {
+        "path": path,
+        "output": output_path,
+        "duration": transcription["duration"] or probe["duration"] or 0.0,
+    }
+
+
+def run_batch(files, workers=4, model="whisper-large-v3-turbo", language=None, prompt=None,
+              force=False, manifest_path=MANIFEST_PATH):
+    """
+    Transcribe files in parallel, skipping those already in the manifest
+
+    Returns:
+        Dictionary with counts of completed, skipped and failed files and throughput
+    """
+    os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
+    completed = set() if force else load_completed(manifest_path)
+    pending = [(path, file_key(path)) for path in files]
+    skipped = sum(1 for _, key in pending if key in completed)
+    pending = [(path, key) for path, key in pending if key not in completed]
+
+    print(f"📁 {len(files)} files: {skipped} already done, {len(pending)} to transcribe with {workers} workers")
+
+    names = output_names(files)
+    client = create_client()
+    # One open connection per worker thread; they stay busy, so no keep-alive pings are needed
+    start_warm_pool(client, min(workers, len(pending)), interval=0)
+    done, failed, audio_seconds = 0, 0, 0.0
+    started = time.monotonic()
+
+    with open(manifest_path, "a") as manifest, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(transcribe_file, client, path, model, language, prompt, names[path]): (path, key)
+            for path, key in pending
+        }
+        for future in as_completed(futures):
+            path, key = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {path}: {e}")
+                continue
+
+            # One line per file, flushed immediately so a crash loses at most the in-flight files
+            record.update(key=key, completed_at=time.time())
+            manifest.write(json.dumps(record) + "\n")
+            manifest.flush()
+            done += 1
+            audio_seconds += record["duration"]
+            print(f"✅ [{done + failed}/{len(pending)}] {path} -> {record['output']}")
+
+    elapsed = time.monotonic() - started
+    stats = {
+        "completed": done,
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed_seconds": elapsed,
+        "files_per_minute": done / elapsed * 60 if elapsed else 0.0,
+        "audio_hours_per_hour": audio_seconds / elapsed if elapsed else 0.0,
+    }
+    print(f"\n📊 {done} completed, {skipped} skipped, {failed} failed in {elapsed:.1f}s")
+    print(f"   Throughput: {stats['files_per_minute']:.2f} files/minute, "
+          f"{stats['audio_hours_per_hour']:.2f} audio-hours/hour")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe audio files in bulk with Groq's Whisper models")
+    parser.add_argument("paths", nargs="*", help="Audio files or directories to walk")
+    parser.add_argument("--manifest", help="Text file listing audio files or directories, one per line")
+    parser.add_argument("--workers", type=int, default=4, help="Number of parallel transcriptions (default: 4)")
+    parser.add_argument("--model", default="whisper-large-v3-turbo", help="Whisper model to use")
+    parser.add_argument("--language", help="Language code, e.g. en (default: auto-detect)")
+    parser.add_argument("--prompt", help="Context or spelling hints for the model")
+    parser.add_argument("--force", action="store_true", help="Transcribe again even if already completed")
+    args = parser.parse_args(argv)
+
+    if not args.paths and not args.manifest:
+        parser.error("give at least one path or --manifest")
+
+    files = find_audio_files(args.paths, args.manifest)
+    stats = run_batch(files, workers=args.workers, model=args.model, language=args.language,
+                      prompt=args.prompt, force=args.force)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,26 @@
 
 import subprocess
 import json
+import math
 import sys
 import os
+import time
+import uuid
+import base64
+import random
+import socket
+import struct
+import asyncio
+import argparse
+import tempfile
+
+# Relative weights of each tool in a load test
+DEFAULT_LOAD_MIX = {
+    "transcribe_audio_file": 3,
+    "transcribe_audio_url": 2,
+    "format_transcription": 2,
+    "get_supported_formats": 1,
+}
 
 def check_mcp_server_status():
     """Comprehensive MCP server diagnostics"""
@@ -170,10 +188,13 @@ def show_usage_examples():
     print("\n3. Test with audio file:")
     print("   uv run python test_mcp_server.py")
     
-    print("\n4. Claude Desktop config location:")
+    print("\n4. Load test with concurrent clients against a fake API:")
+    print("   uv run python mcp_diagnostics.py --load --sessions 16 --duration 60")
+    
+    print("\n5. Claude Desktop config location:")
     print("   ~/Library/Application Support/Claude/claude_desktop_config.json")
     
-    print("\n5. Example Claude Desktop config:")
+    print("\n6. Example Claude Desktop config:")
     print("""   {
      "mcpServers": {
        "groq-audio-transcription": {
@@ -187,7 +208,237 @@ def show_usage_examples():
      }
    }""")
 
+def parse_mix(text):
+    """Parse "tool=weight,tool=weight" into a weight dictionary"""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in DEFAULT_LOAD_MIX:
+            raise ValueError(f"Unknown tool in mix: {name.strip()}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def process_rss_bytes(pid):
+    """Current resident memory of a process, or None if it cannot be read"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        # macOS and other systems without /proc
+        output = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+        return int(output.strip()) * 1024
+    except (OSError, ValueError):
+        return None
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def synthetic_clip(seconds, sample_rate=16000):
+    """A short silent WAV with a random tail, unique so checkpoints never short-circuit the API call"""
+    data = bytes(int(seconds * sample_rate) * 2 - 16) + os.urandom(16)
+    header = b"RIFF" + struct.pack("<I", 36 + len(data)) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    return header + b"data" + struct.pack("<I", len(data)) + data
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _tool_failed(name, result):
+    """Tools report failures inside their result instead of raising"""
+    if result.isError:
+        return True
+    text = result.content[0].text if result.content else ""
+    if name == "format_transcription":
+        return text.startswith("Error")
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and "error" in data
+
+
+async def _load_session(server_url, fake_api_url, static_dir, mix, deadline, clip_seconds, sample, samples, seed):
+    from mcp.client.session import ClientSession
+    from mcp.client.streamable_http import streamablehttp_client
+
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    async with streamablehttp_client(server_url, timeout=120) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                if name == "transcribe_audio_file":
+                    arguments = {"audio_data": base64.b64encode(synthetic_clip(clip_seconds)).decode(),
+                                 "filename": "load.wav"}
+                elif name == "transcribe_audio_url":
+                    clip_name = f"{uuid.uuid4().hex}.wav"
+                    with open(os.path.join(static_dir, clip_name), "wb") as f:
+                        f.write(synthetic_clip(clip_seconds))
+                    arguments = {"audio_url": f"{fake_api_url}/{clip_name}"}
+                elif name == "format_transcription":
+                    arguments = {"transcription_data": sample}
+                else:
+                    arguments = {}
+
+                started = time.perf_counter()
+                try:
+                    failed = _tool_failed(name, await session.call_tool(name, arguments))
+                except Exception:
+                    failed = True
+                samples.append((name, time.perf_counter() - started, failed))
+
+
+async def _sample_rss(pid, started, stop, timeline, interval=0.5):
+    while not stop.is_set():
+        rss = process_rss_bytes(pid)
+        if rss is not None:
+            timeline.append((time.monotonic() - started, rss))
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def run_load_test(sessions=8, duration=30.0, mix=None, api_latency=0.2, clip_seconds=10.0):
+    """
+    Drive mcp_server.py with concurrent MCP client sessions and report latency and memory
+
+    The server runs once over streamable HTTP, the way several agents would share
+    it, and talks to fake_groq_server.py instead of the Groq API.
+    """
+    from fake_groq_server import build_transcription
+
+    mix = mix or DEFAULT_LOAD_MIX
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    print("🏋️  MCP Server Load Test")
+    print("=" * 50)
+    print(f"   • Sessions: {sessions}, duration: {duration:.0f}s, fake API latency: {api_latency:.2f}s")
+    print(f"   • Mix: {', '.join(f'{name}={weight:g}' for name, weight in mix.items())}")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        static_dir = os.path.join(work_dir, "static")
+        os.makedirs(static_dir)
+
+        fake_api = subprocess.Popen(
+            [sys.executable, os.path.join(here, "fake_groq_server.py"), "--port", "0",
+             "--latency", str(api_latency), "--static-dir", static_dir],
+            stdout=subprocess.PIPE, text=True,
+        )
+        fake_api_url = fake_api.stdout.readline().strip()
+
+        port = _free_port()
+        env = dict(os.environ, GROQ_BASE_URL=fake_api_url, GROQ_API_KEY="fake",
+                   GROQ_CHUNK_STORE_DIR=os.path.join(work_dir, "chunk_store"),
+                   MCP_TRANSPORT="streamable-http", MCP_PORT=str(port))
+        with open(os.path.join(work_dir, "server.log"), "w") as log:
+            server = subprocess.Popen([sys.executable, os.path.join(here, "mcp_server.py")],
+                                      env=env, cwd=work_dir, stdout=log, stderr=log)
+        try:
+            if not _wait_for_port(port):
+                print("   • Server startup: ❌ Not listening")
+                return False
+
+            transcription = build_transcription(clip_seconds)
+            sample = {
+                "text": transcription["text"],
+                "language": transcription["language"],
+                "duration": clip_seconds,
+                "segments": [
+                    {"start": s["start"], "end": s["end"], "text": s["text"].strip(), "formatted_time": ""}
+                    for s in transcription["segments"]
+                ],
+                "metadata": {"model": "whisper-large-v3-turbo", "total_segments": len(transcription["segments"])},
+            }
+
+            samples, timeline = [], []
+
+            async def drive():
+                started = time.monotonic()
+                stop = asyncio.Event()
+                sampler = asyncio.create_task(_sample_rss(server.pid, started, stop, timeline))
+                deadline = started + duration
+                results = await asyncio.gather(*(
+                    _load_session(f"http://127.0.0.1:{port}/mcp", fake_api_url, static_dir, mix,
+                                  deadline, clip_seconds, sample, samples, seed)
+                    for seed in range(sessions)
+                ), return_exceptions=True)
+                stop.set()
+                await sampler
+                return time.monotonic() - started, [r for r in results if isinstance(r, BaseException)]
+
+            elapsed, session_errors = asyncio.run(drive())
+        finally:
+            server.terminate()
+            server.wait()
+            fake_api.terminate()
+            fake_api.wait()
+
+    print(f"\n📊 Results ({len(samples)} calls in {elapsed:.1f}s, {len(samples) / elapsed:.1f} calls/s):")
+    print(f"   {'tool':<24} {'calls':>6} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in mix:
+        latencies = sorted(latency * 1000 for tool, latency, _ in samples if tool == name)
+        errors = sum(1 for tool, _, failed in samples if tool == name and failed)
+        rate = errors / len(latencies) * 100 if latencies else 0.0
+        print(f"   {name:<24} {len(latencies):>6} {rate:>6.1f}% {percentile(latencies, 50):>8.0f} "
+              f"{percentile(latencies, 95):>8.0f} {percentile(latencies, 99):>8.0f}")
+    for error in session_errors:
+        print(f"   • Session failed: ❌ {error!r}")
+
+    if timeline:
+        print("\n🧠 Server RSS over time:")
+        step = max(1, -(-len(timeline) // 10))
+        for offset, rss in timeline[::step]:
+            print(f"   {offset:6.1f}s  {rss / 1024 / 1024:8.1f} MB")
+        peak = max(rss for _, rss in timeline)
+        print(f"   • Start {timeline[0][1] / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB, "
+              f"end {timeline[-1][1] / 1024 / 1024:.1f} MB")
+
+    return not session_errors and all(not failed for _, _, failed in samples)
+
+
 if __name__ == "__main__":
-    success = check_mcp_server_status()
-    show_usage_examples()
+    parser = argparse.ArgumentParser(description="MCP server diagnostics and load testing")
+    parser.add_argument("--load", action="store_true", help="Run a concurrent load test instead of the diagnostics")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent MCP client sessions (default: 8)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Load test length in seconds (default: 30)")
+    parser.add_argument("--mix", type=parse_mix, help="Tool weights, e.g. transcribe_audio_file=3,get_supported_formats=1")
+    parser.add_argument("--api-latency", type=float, default=0.2, help="Fake transcription API latency in seconds")
+    parser.add_argument("--clip-seconds", type=float, default=10.0, help="Length of each synthetic audio clip")
+    args = parser.parse_args()
+
+    if args.load:
+        success = run_load_test(args.sessions, args.duration, args.mix, args.api_latency, args.clip_seconds)
+    else:
+        success = check_mcp_server_status()
+        show_usage_examples()
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -4,10 +4,24 @@ import os
 import json
 import tempfile
 import base64
+import inspect
+import functools
 from typing import Any, Dict, Optional
-from mcp.server.fastmcp import FastMCP
-from groq import Groq
+import anyio
+from mcp.server.fastmcp import Context, FastMCP
 from dotenv import load_dotenv
+from api_client import create_client, start_warm_pool
+from audio_probe import (
+    FORMAT_EXTENSIONS, SNIFF_BYTES, AudioProbeError,
+    check_upload_size, preflight_audio, sniff_format,
+)
+from chunked_transcription import CHUNK_SECONDS, max_input_bytes
+from job_queue import JOB_QUEUE_ENABLED, queue_stats, run_transcription
+from profiling import profile_request
+from resegment import PRESETS, resegment_words
+from scheduler import current_client
+from url_download import download_audio
+from wire_format import RESULT_FORMATS, encode_columns, expand_result, format_time_range, joined_text
 
 # Load environment variables
 load_dotenv()
@@ -15,176 +29,280 @@ load_dotenv()
 # Initialize the MCP server
 mcp = FastMCP("Groq Audio Transcription Server")
 
-# Initialize the Groq client
-client = Groq()
+# Initialize the Groq client; its connections are pre-warmed when the server starts
+client = create_client()
 
-@mcp.tool()
-def transcribe_audio_file(audio_data: str, filename: str = "audio.wav", model: str = "whisper-large-v3-turbo") -> Dict[str, Any]:
+# Base64 characters decoded at a time (a multiple of 4, so 768 KB of audio per slice)
+BASE64_SLICE_CHARS = 1024 * 1024
+
+def run_in_thread(func):
+    """
+    Async MCP tool that runs a blocking tool function in a worker thread
+
+    FastMCP runs sync tools on its event loop, which would serve transcriptions
+    strictly one at a time in arrival order. In threads they wait for the
+    scheduler instead, tagged with the calling client for its fair share.
+    """
+    @functools.wraps(func)
+    async def tool(ctx: Context, **kwargs):
+        current_client.set(ctx.client_id or f"mcp:{id(ctx.session):x}")
+        return await anyio.to_thread.run_sync(functools.partial(func, **kwargs))
+
+    signature = inspect.signature(func)
+    context = inspect.Parameter("ctx", inspect.Parameter.KEYWORD_ONLY, annotation=Context)
+    tool.__signature__ = signature.replace(parameters=[*signature.parameters.values(), context])
+    tool.__annotations__ = {**func.__annotations__, "ctx": Context}
+    return tool
+
+def transcribe_audio_file(audio_data: str, filename: str = "audio.wav", model: str = "whisper-large-v3-turbo",
+                          language: Optional[str] = None, prompt: Optional[str] = None,
+                          include_words: bool = False, result_format: str = "json",
+                          profile: bool = False) -> Dict[str, Any]:
     """
     Transcribe audio from base64 encoded audio data using Groq's Whisper model
     
     Args:
         audio_data: Base64 encoded audio file data
-        filename: Original filename (optional, used for format detection)
+        filename: Original filename (optional), returned in the metadata only; the format
+            is detected from the audio's magic bytes
         model: Whisper model to use (default: whisper-large-v3-turbo)
+        language: Language of the audio as an ISO-639-1 code (default: auto-detect)
+        prompt: Context or spelling hints for the model; retrying with another language
+            or prompt only re-sends the parts transcribed with low confidence
+        include_words: Include word-level timestamps, needed to re-segment with format_transcription
+        result_format: "json" for a list of segment objects, or "columnar" for compact
+            parallel arrays with delta-encoded millisecond timestamps under "columns"
+        profile: Profile this call; the profile's files and hottest functions are
+            returned under "metadata.profile"
     
     Returns:
         Dictionary containing transcription results with timestamps and metadata
     """
-    try:
-        # Decode base64 audio data
-        audio_bytes = base64.b64decode(audio_data)
-        
-        # Create a temporary file to store the audio
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1], delete=False) as temp_file:
-            temp_file.write(audio_bytes)
-            temp_file_path = temp_file.name
-        
+    with profile_request("transcribe_audio_file", force=profile) as profiled:
         try:
-            # Transcribe the audio file
-            with open(temp_file_path, "rb") as file:
-                transcription = client.audio.transcriptions.create(
-                    file=file,
-                    model=model,
-                    response_format="verbose_json",
-                    timestamp_granularities=["word", "segment"],
-                    temperature=0.0
-                )
+            if result_format not in RESULT_FORMATS:
+                raise ValueError(f"Unknown result_format '{result_format}', expected one of {', '.join(RESULT_FORMATS)}")
             
-            # Process the transcription results
-            result = {
-                "text": transcription.text,
-                "language": transcription.language,
-                "duration": transcription.duration,
-                "segments": [],
-                "metadata": {
-                    "model": model,
-                    "filename": filename,
-                    "total_segments": len(transcription.segments) if hasattr(transcription, 'segments') else 0
-                }
-            }
+            # Reject oversized uploads before decoding the payload
+            check_upload_size(len(audio_data) * 3 // 4, max_input_bytes())
             
-            # Add segments with timestamps if available
-            if hasattr(transcription, 'segments') and transcription.segments:
-                for segment in transcription.segments:
-                    start_time = segment["start"]
-                    end_time = segment["end"]
-                    text = segment["text"].strip()
-                    
-                    # Format timestamps as MM:SS.ss
-                    start_formatted = f"{int(start_time//60):02d}:{start_time%60:05.2f}"
-                    end_formatted = f"{int(end_time//60):02d}:{end_time%60:05.2f}"
-                    
-                    result["segments"].append({
-                        "start": start_time,
-                        "end": end_time,
-                        "text": text,
-                        "formatted_time": f"[{start_formatted} - {end_formatted}]"
-                    })
+            # Line breaks inside the base64 text would misalign the slices decoded below
+            if "\n" in audio_data or "\r" in audio_data or " " in audio_data:
+                audio_data = "".join(audio_data.split())
+            
+            # Decode the first slice of base64 audio data; a multiple of 4 characters decodes on its own
+            head = base64.b64decode(audio_data[:BASE64_SLICE_CHARS])
+            
+            # Detect the real format from magic bytes rather than trusting the filename
+            audio_format = sniff_format(head[:SNIFF_BYTES])
+            if audio_format is None:
+                raise AudioProbeError("Unsupported or unrecognised audio format")
             
-            return result
+            # Create a temporary file to store the audio
+            with tempfile.NamedTemporaryFile(suffix=FORMAT_EXTENSIONS[audio_format], delete=False) as temp_file:
+                temp_file_path = temp_file.name
             
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            try:
+                # Decode slice by slice straight to disk instead of holding a full decoded copy
+                with open(temp_file_path, "wb") as temp_file:
+                    temp_file.write(head)
+                    for start in range(BASE64_SLICE_CHARS, len(audio_data), BASE64_SLICE_CHARS):
+                        temp_file.write(base64.b64decode(audio_data[start:start + BASE64_SLICE_CHARS]))
                 
-    except Exception as e:
-        return {
-            "error": f"Error transcribing audio: {str(e)}",
-            "success": False
-        }
+                probe = preflight_audio(temp_file_path, max_bytes=max_input_bytes())
+                
+                # Transcribe the audio file, in checkpointed chunks when it is long (in a worker if the job queue is enabled)
+                transcription = run_transcription(client, temp_file_path, model=model,
+                                                  language=language, prompt=prompt, probe=probe)
+                
+                # Process the transcription results
+                result = {
+                    "text": transcription["text"],
+                    "language": transcription["language"],
+                    "duration": transcription["duration"],
+                    "segments": [],
+                    "metadata": {
+                        "model": model,
+                        "filename": filename,
+                        "format": probe["format"],
+                        "codec": probe["codec"],
+                        "estimated_duration": probe["duration"],
+                        "total_segments": len(transcription["segments"]),
+                        "chunks": transcription.get("chunks")
+                    }
+                }
+                
+                if profiled:
+                    # Completed with the timings and hottest functions when the profile ends
+                    result["metadata"]["profile"] = profiled
+                
+                if result_format == "columnar":
+                    # Parallel arrays instead of one object per segment (and word); when the full
+                    # text only repeats the segment texts, decoders rebuild it from them
+                    del result["segments"]
+                    if transcription["text"].strip() == joined_text(transcription["segments"]):
+                        del result["text"]
+                    result["columns"] = encode_columns(transcription["segments"],
+                                                       transcription["words"] if include_words else None)
+                    return result
+                
+                # Add segments with timestamps if available
+                if transcription["segments"]:
+                    for segment in transcription["segments"]:
+                        start_time = segment["start"]
+                        end_time = segment["end"]
+                        text = segment["text"].strip()
+                        
+                        result["segments"].append({
+                            "start": start_time,
+                            "end": end_time,
+                            "text": text,
+                            "formatted_time": format_time_range(start_time, end_time)
+                        })
+                
+                if include_words:
+                    result["words"] = [
+                        {"word": word["word"], "start": word["start"], "end": word["end"]}
+                        for word in transcription["words"]
+                    ]
+                
+                return result
+                
+            finally:
+                # Clean up temporary file
+                if os.path.exists(temp_file_path):
+                    os.unlink(temp_file_path)
+                    
+        except Exception as e:
+            return {
+                "error": f"Error transcribing audio: {str(e)}",
+                "success": False
+            }
 
-@mcp.tool()
-def transcribe_audio_url(audio_url: str, model: str = "whisper-large-v3-turbo") -> Dict[str, Any]:
+def transcribe_audio_url(audio_url: str, model: str = "whisper-large-v3-turbo",
+                         language: Optional[str] = None, prompt: Optional[str] = None,
+                         include_words: bool = False, result_format: str = "json",
+                         profile: bool = False) -> Dict[str, Any]:
     """
     Transcribe audio from a URL using Groq's Whisper model
     
     Args:
         audio_url: URL to the audio file
         model: Whisper model to use (default: whisper-large-v3-turbo)
+        language: Language of the audio as an ISO-639-1 code (default: auto-detect)
+        prompt: Context or spelling hints for the model; retrying with another language
+            or prompt only re-sends the parts transcribed with low confidence
+        include_words: Include word-level timestamps, needed to re-segment with format_transcription
+        result_format: "json" for a list of segment objects, or "columnar" for compact
+            parallel arrays with delta-encoded millisecond timestamps under "columns"
+        profile: Profile this call; the profile's files and hottest functions are
+            returned under "metadata.profile"
     
     Returns:
         Dictionary containing transcription results with timestamps and metadata
     """
-    try:
-        import requests
-        
-        # Download the audio file
-        response = requests.get(audio_url)
-        response.raise_for_status()
-        
-        # Get filename from URL
-        filename = os.path.basename(audio_url.split('?')[0]) or "audio.wav"
-        
-        # Create a temporary file to store the audio
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1], delete=False) as temp_file:
-            temp_file.write(response.content)
-            temp_file_path = temp_file.name
-        
+    with profile_request("transcribe_audio_url", force=profile) as profiled:
         try:
-            # Transcribe the audio file
-            with open(temp_file_path, "rb") as file:
-                transcription = client.audio.transcriptions.create(
-                    file=file,
-                    model=model,
-                    response_format="verbose_json",
-                    timestamp_granularities=["word", "segment"],
-                    temperature=0.0
-                )
-            
-            # Process the transcription results (same as above)
-            result = {
-                "text": transcription.text,
-                "language": transcription.language,
-                "duration": transcription.duration,
-                "segments": [],
-                "metadata": {
-                    "model": model,
-                    "source_url": audio_url,
-                    "filename": filename,
-                    "total_segments": len(transcription.segments) if hasattr(transcription, 'segments') else 0
-                }
-            }
+            if result_format not in RESULT_FORMATS:
+                raise ValueError(f"Unknown result_format '{result_format}', expected one of {', '.join(RESULT_FORMATS)}")
             
-            # Add segments with timestamps if available
-            if hasattr(transcription, 'segments') and transcription.segments:
-                for segment in transcription.segments:
-                    start_time = segment["start"]
-                    end_time = segment["end"]
-                    text = segment["text"].strip()
-                    
-                    # Format timestamps as MM:SS.ss
-                    start_formatted = f"{int(start_time//60):02d}:{start_time%60:05.2f}"
-                    end_formatted = f"{int(end_time//60):02d}:{end_time%60:05.2f}"
-                    
-                    result["segments"].append({
-                        "start": start_time,
-                        "end": end_time,
-                        "text": text,
-                        "formatted_time": f"[{start_formatted} - {end_formatted}]"
-                    })
+            # Get filename from URL
+            filename = os.path.basename(audio_url.split('?')[0]) or "audio.wav"
             
-            return result
+            # Download through the shared session: parallel ranges when supported,
+            # and no transfer at all when the cached copy is still current
+            temp_file_path, download = download_audio(audio_url, max_bytes=max_input_bytes())
             
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            try:
+                probe = preflight_audio(temp_file_path, max_bytes=max_input_bytes())
                 
-    except Exception as e:
-        return {
-            "error": f"Error transcribing audio from URL: {str(e)}",
-            "success": False
-        }
+                # Transcribe the audio file, in checkpointed chunks when it is long (in a worker if the job queue is enabled)
+                transcription = run_transcription(client, temp_file_path, model=model,
+                                                  language=language, prompt=prompt, probe=probe)
+                
+                # Process the transcription results (same as above)
+                result = {
+                    "text": transcription["text"],
+                    "language": transcription["language"],
+                    "duration": transcription["duration"],
+                    "segments": [],
+                    "metadata": {
+                        "model": model,
+                        "source_url": audio_url,
+                        "filename": filename,
+                        "format": probe["format"],
+                        "codec": probe["codec"],
+                        "estimated_duration": probe["duration"],
+                        "total_segments": len(transcription["segments"]),
+                        "chunks": transcription.get("chunks"),
+                        "download": {"cached": download["cached"], "parts": download["parts"]}
+                    }
+                }
+                
+                if profiled:
+                    # Completed with the timings and hottest functions when the profile ends
+                    result["metadata"]["profile"] = profiled
+                
+                if result_format == "columnar":
+                    # Parallel arrays instead of one object per segment (and word); when the full
+                    # text only repeats the segment texts, decoders rebuild it from them
+                    del result["segments"]
+                    if transcription["text"].strip() == joined_text(transcription["segments"]):
+                        del result["text"]
+                    result["columns"] = encode_columns(transcription["segments"],
+                                                       transcription["words"] if include_words else None)
+                    return result
+                
+                # Add segments with timestamps if available
+                if transcription["segments"]:
+                    for segment in transcription["segments"]:
+                        start_time = segment["start"]
+                        end_time = segment["end"]
+                        text = segment["text"].strip()
+                        
+                        result["segments"].append({
+                            "start": start_time,
+                            "end": end_time,
+                            "text": text,
+                            "formatted_time": format_time_range(start_time, end_time)
+                        })
+                
+                if include_words:
+                    result["words"] = [
+                        {"word": word["word"], "start": word["start"], "end": word["end"]}
+                        for word in transcription["words"]
+                    ]
+                
+                return result
+                
+            finally:
+                # Clean up this call's copy; the cache keeps its own
+                if os.path.exists(temp_file_path):
+                    os.unlink(temp_file_path)
+                    
+        except Exception as e:
+            return {
+                "error": f"Error transcribing audio from URL: {str(e)}",
+                "success": False
+            }
+
+mcp.tool()(run_in_thread(transcribe_audio_file))
+mcp.tool()(run_in_thread(transcribe_audio_url))
 
 @mcp.tool()
-def format_transcription(transcription_data: Dict[str, Any]) -> str:
+def format_transcription(transcription_data: Dict[str, Any], resegment: Optional[str] = None,
+                         max_chars: Optional[int] = None, max_duration: Optional[float] = None,
+                         max_pause: Optional[float] = None) -> str:
     """
     Format transcription data into a readable text format with timestamps
     
     Args:
-        transcription_data: Dictionary containing transcription results
+        transcription_data: Dictionary containing transcription results (row or columnar format)
+        resegment: Regroup word timestamps into "captions" or "paragraphs" instead of
+            using the API's segments (requires transcribing with include_words=True)
+        max_chars: Override the preset's maximum characters per line
+        max_duration: Override the preset's maximum seconds per line
+        max_pause: Override the preset's pause (seconds) that starts a new line
         
     Returns:
         Formatted transcription text with timestamps
@@ -193,20 +311,38 @@ def format_transcription(transcription_data: Dict[str, Any]) -> str:
         if "error" in transcription_data:
             return f"Error: {transcription_data['error']}"
         
+        # Results requested with result_format="columnar" are expanded back to segment objects
+        transcription_data = expand_result(transcription_data)
+        
+        segments = transcription_data.get("segments", [])
+        if resegment:
+            if resegment not in PRESETS:
+                return f"Error: Unknown resegment mode '{resegment}', expected one of {', '.join(PRESETS)}"
+            if not transcription_data.get("words"):
+                return "Error: Re-segmenting needs word timestamps; transcribe with include_words=True"
+            
+            options = dict(PRESETS[resegment])
+            for name, value in (("max_chars", max_chars), ("max_duration", max_duration), ("max_pause", max_pause)):
+                if value is not None:
+                    options[name] = value
+            
+            segments = []
+            for segment in resegment_words(transcription_data["words"], **options):
+                segments.append({**segment, "formatted_time": format_time_range(segment["start"], segment["end"])})
+        
         formatted_output = []
         
         # Add header information
         metadata = transcription_data.get("metadata", {})
         formatted_output.append(f"Language: {transcription_data.get('language', 'Unknown')}")
         formatted_output.append(f"Duration: {transcription_data.get('duration', 0):.2f} seconds")
-        formatted_output.append(f"Total segments: {metadata.get('total_segments', 0)}")
+        formatted_output.append(f"Total segments: {len(segments) if resegment else metadata.get('total_segments', 0)}")
         formatted_output.append(f"Model: {metadata.get('model', 'Unknown')}")
         formatted_output.append("")
         formatted_output.append("TRANSCRIPTION WITH TIMESTAMPS:")
         formatted_output.append("=" * 40)
         
         # Add segments with timestamps
-        segments = transcription_data.get("segments", [])
         if segments:
             for segment in segments:
                 formatted_time = segment.get("formatted_time", "")
@@ -231,14 +367,24 @@ def get_supported_formats() -> Dict[str, Any]:
     """
     return {
         "supported_formats": [
-            "MP3", "MP4", "M4A", "MPEG", "MPGA", "M4B", "WAV", "WEBM"
+            "MP3", "MP4", "M4A", "MPEG", "MPGA", "M4B", "WAV", "WEBM", "OGG", "FLAC"
         ],
+        "max_file_size_mb": max_input_bytes() / 1024 / 1024,
+        "chunk_seconds": CHUNK_SECONDS,
         "features": [
             "Automatic language detection",
             "Segment-level timestamps",
             "Word-level timestamps",
+            "Re-segmentation of words into caption lines or paragraphs",
+            "Long files split into checkpointed chunks that resume after a crash",
+            "Edited re-uploads only transcribe the chunks whose audio changed",
+            "Retries with another language or prompt only re-send low-confidence chunks",
+            "Compact columnar result format with delta-encoded timestamps",
+            "Shortest-job-first scheduling with a fair share per client",
+            "On-demand profiling of single requests",
             "High-quality transcription using Whisper models"
         ],
+        "result_formats": list(RESULT_FORMATS),
         "available_models": [
             "whisper-large-v3-turbo",
             "whisper-large-v3"
@@ -249,6 +395,26 @@ def get_supported_formats() -> Dict[str, Any]:
         ]
     }
 
+@mcp.tool()
+def get_queue_stats() -> Dict[str, Any]:
+    """
+    Get how long transcriptions wait before they start, per priority class
+
+    Requests are served shortest audio first with a fair share per client, and
+    any request waiting longer than GROQ_STARVATION_SECONDS goes next.
+
+    Returns:
+        Dictionary with the mode ("in_process" or "job_queue"), the running
+        transcriptions and, for the short, medium and long classes, the number
+        waiting and the mean, p50, p95 and max wait in seconds
+    """
+    return queue_stats()
+
 if __name__ == "__main__":
-    # Run the MCP server
-    mcp.run()
\ No newline at end of file
+    # Run the MCP server; MCP_TRANSPORT=streamable-http serves many clients from one process
+    mcp.settings.port = int(os.getenv("MCP_PORT", mcp.settings.port))
+    if not JOB_QUEUE_ENABLED:
+        # Open the API connections in the background rather than on the first transcription
+        # (workers do their own); stdout is the protocol channel of the stdio transport
+        start_warm_pool(client, wait=False)
+    mcp.run(transport=os.getenv("MCP_TRANSPORT", "stdio"))
\ No newline at end of file
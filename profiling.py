@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+On-demand profiles of single transcription requests.
+
+A request is profiled when the caller asks for it (the MCP tools' `profile`
+argument) or, with GROQ_PROFILE_PERCENT set, for that percentage of requests
+picked at random, so profiling can stay enabled under load. Each profile is
+written to GROQ_PROFILE_DIR next to a text summary of its hottest functions,
+and only the newest GROQ_PROFILE_KEEP profiles are kept.
+
+Two modes:
+
+- "sampling", used for the GROQ_PROFILE_PERCENT requests: a background thread
+  records the request thread's stack every GROQ_PROFILE_INTERVAL_MS, saved as
+  collapsed stacks (.folded) for flame graph tools. Cheap, only the sampled
+  thread is inspected, and any number of requests can be sampled.
+- "cprofile", used when the caller asks for the request to be profiled:
+  deterministic cProfile of the whole request, saved as a .prof file for
+  pstats or snakeviz. It slows the request down, and since Python 3.12 it
+  records every thread of the process, slowing the others too, so only one
+  request is cProfiled at a time; others asked for meanwhile are sampled.
+"""
+
+import os
+import io
+import sys
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Percentage of requests profiled without being asked for (0 turns sampling off)
+PROFILE_PERCENT = float(os.getenv("GROQ_PROFILE_PERCENT", "0"))
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+PROFILE_DIR = os.getenv("GROQ_PROFILE_DIR", os.path.join("transcripts", ".profiles"))
+
+# Most recent profiles kept; older ones are deleted when a new one is written
+PROFILE_KEEP = int(os.getenv("GROQ_PROFILE_KEEP", "50"))
+
+# Stack sampling period of the "sampling" mode
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("GROQ_PROFILE_INTERVAL_MS", "5")) / 1000
+
+# Functions listed in summaries, and returned with the request
+SUMMARY_FUNCTIONS = 25
+REPORT_FUNCTIONS = 5
+
+# cProfile can only run once per process at a time
+_cprofile_lock = threading.Lock()
+
+
+def should_profile(force: bool = False) -> bool:
+    """Whether to profile this request: always when forced, else GROQ_PROFILE_PERCENT of the time"""
+    return force or (PROFILE_PERCENT > 0 and random.uniform(0, 100) < PROFILE_PERCENT)
+
+
+def function_label(filename: str, lineno: int, name: str) -> str:
+    """Short name of a function: file (without its directory), line and function name"""
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+class StackSampler:
+    """Records one thread's call stack at a fixed interval from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(function_label(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            # Outermost call first, as in collapsed stack files
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    @property
+    def sample_seconds(self) -> float:
+        """Wall time each sample stands for; sampling takes a little longer than the interval"""
+        return self.elapsed / self.samples if self.samples else self.interval
+
+    def hot_functions(self) -> List[Dict[str, Any]]:
+        """Functions by samples spent in them (self) and under them (total), hottest first"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            if stack:
+                own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return [
+            {"function": label, "self_seconds": round(own[label] * self.sample_seconds, 4),
+             "total_seconds": round(total[label] * self.sample_seconds, 4)}
+            for label in sorted(total, key=lambda label: (own[label], total[label]), reverse=True)
+        ]
+
+
+def cprofile_hot_functions(stats: pstats.Stats) -> List[Dict[str, Any]]:
+    """Functions of a cProfile run by time spent in them (self) and under them (total), hottest first"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+    return [
+        {"function": function_label(*key), "calls": calls,
+         "self_seconds": round(own, 4), "total_seconds": round(total, 4)}
+        for key, (_, calls, own, total, _) in rows
+    ]
+
+
+def format_summary(report: Dict[str, Any], functions: List[Dict[str, Any]], details: str = "") -> str:
+    lines = [
+        f"Profile {report['id']} of {report['name']} ({report['mode']})",
+        f"Wall time: {report['seconds']:.3f}s",
+        "",
+        f"{'self s':>9} {'total s':>9}  function",
+    ]
+    for function in functions[:SUMMARY_FUNCTIONS]:
+        lines.append(f"{function['self_seconds']:>9.3f} {function['total_seconds']:>9.3f}  {function['function']}")
+    if details:
+        lines += ["", details]
+    return "\n".join(lines) + "\n"
+
+
+def rotate_profiles(directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP) -> None:
+    """Delete all but the newest `keep` profiles (each profile's files share one name stem)"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    stems = {}
+    for name in names:
+        stem = name.split(".", 1)[0]
+        path = os.path.join(directory, name)
+        try:
+            stems[stem] = max(stems.get(stem, 0), os.path.getmtime(path))
+        except FileNotFoundError:
+            continue
+    for stem in sorted(stems, key=stems.get, reverse=True)[keep:]:
+        for name in names:
+            if name.split(".", 1)[0] == stem:
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+@contextmanager
+def profile_request(name: str, force: bool = False, mode: Optional[str] = None,
+                    directory: str = PROFILE_DIR):
+    """
+    Profile the with block when should_profile() picks this request
+
+    Args:
+        name: What is being profiled, used in file names (e.g. the tool name)
+        force: Profile regardless of GROQ_PROFILE_PERCENT
+        mode: "cprofile" or "sampling" (default: "cprofile" when forced, else "sampling")
+        directory: Where profiles are written
+
+    Yields:
+        None when the request is not profiled. Otherwise a report dictionary
+        with the profile "id", "mode" and file paths, which is completed with
+        "seconds" and the "top" functions when the block exits.
+    """
+    if not should_profile(force):
+        yield None
+        return
+
+    # cProfile slows every thread of the process, so only requests asked for explicitly get it
+    mode = mode or ("cprofile" if force else "sampling")
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', expected one of {', '.join(PROFILE_MODES)}")
+    if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+        mode = "sampling"
+
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{name}_{uuid.uuid4().hex[:8]}"
+    stem = os.path.join(directory, profile_id)
+    report = {
+        "id": profile_id,
+        "name": name,
+        "mode": mode,
+        "profile_path": stem + (".prof" if mode == "cprofile" else ".folded"),
+        "summary_path": stem + ".txt",
+    }
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger's) holds the interpreter's profiling hook
+            _cprofile_lock.release()
+            mode = report["mode"] = "sampling"
+            report["profile_path"] = stem + ".folded"
+    if mode == "sampling":
+        profiler = StackSampler(threading.get_ident())
+        profiler.start()
+    started = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report["seconds"] = round(time.perf_counter() - started, 4)
+        if mode == "cprofile":
+            profiler.disable()
+            _cprofile_lock.release()
+        else:
+            profiler.stop()
+        try:
+            write_profile(report, profiler, directory)
+        except OSError as e:
+            # A failed profile must not fail the request it measured
+            report["error"] = str(e)
+            print(f"⚠️  Could not save profile {report['id']}: {e}", file=sys.stderr)
+
+
+def write_profile(report: Dict[str, Any], profiler, directory: str = PROFILE_DIR) -> None:
+    """Save a finished profile and its summary, and add the hottest functions to the report"""
+    if report["mode"] == "cprofile":
+        profiler.dump_stats(report["profile_path"])
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_FUNCTIONS)
+        functions = cprofile_hot_functions(stats)
+        details = stream.getvalue().strip()
+    else:
+        with open(report["profile_path"], "w") as f:
+            for stack, count in profiler.stacks.items():
+                f.write(f"{';'.join(stack)} {count}\n")
+        functions = profiler.hot_functions()
+        details = f"{profiler.samples} samples, one every {profiler.sample_seconds * 1000:.1f} ms"
+
+    with open(report["summary_path"], "w") as f:
+        f.write(format_summary(report, functions, details))
+    report["top"] = functions[:REPORT_FUNCTIONS]
+    rotate_profiles(directory)
+    # stderr: stdout is the protocol channel of the MCP server's stdio transport
+    print(f"🔬 Profiled {report['name']} in {report['seconds']:.2f}s: {report['summary_path']}", file=sys.stderr)
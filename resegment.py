@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Re-segmentation of word timestamps into caption lines or paragraphs.
+
+Whisper's own segments are often too long for subtitles and too short for
+readable paragraphs. This module regroups the word-level timestamps by pause
+length, characters per line and line duration. For every word it computes, in
+one vectorized pass, where a line starting at that word would have to end;
+walking that jump table from the first word then yields the greedy lines in
+time proportional to the number of lines, not words.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+# Subtitle-style lines: two short lines on screen, broken at natural pauses
+CAPTION_PRESET = {"max_chars": 42, "max_duration": 6.0, "max_pause": 0.7}
+
+# Readable paragraphs: long blocks broken at longer pauses
+PARAGRAPH_PRESET = {"max_chars": 600, "max_duration": 90.0, "max_pause": 2.0}
+
+PRESETS = {"captions": CAPTION_PRESET, "paragraphs": PARAGRAPH_PRESET}
+
+
+def line_breaks(starts: np.ndarray, ends: np.ndarray, lengths: np.ndarray,
+                max_chars: int = 42, max_duration: float = 6.0,
+                max_pause: Optional[float] = 0.7) -> np.ndarray:
+    """
+    Compute greedy line boundaries over word arrays
+
+    Args:
+        starts: Word start times in seconds, sorted
+        ends: Word end times in seconds
+        lengths: Number of characters in each word (without surrounding spaces)
+        max_chars: Maximum characters per line, including single spaces between words
+        max_duration: Maximum seconds from a line's first word start to its last word end
+        max_pause: Silence (seconds) between words that always starts a new line
+
+    Returns:
+        Array of word indices where each line starts, followed by len(starts)
+    """
+    n = len(starts)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+
+    indices = np.arange(n)
+
+    # chars[k] = characters of words 0..k-1 each followed by one space, so a line
+    # of words i..j-1 spans chars[j] - chars[i] - 1 characters
+    chars = np.concatenate(([0], np.cumsum(lengths + 1)))
+    by_chars = np.searchsorted(chars, chars[:-1] + max_chars + 1, side="right") - 1
+
+    # Running maximum keeps end times monotonic when overlapping words are reported
+    line_ends = np.maximum.accumulate(ends)
+    by_duration = np.searchsorted(line_ends, starts + max_duration, side="right")
+
+    nxt = np.minimum(by_chars, by_duration)
+    if max_pause is not None:
+        gaps = starts[1:] - line_ends[:-1]
+        pauses = np.flatnonzero(gaps >= max_pause) + 1
+        following = np.searchsorted(pauses, indices, side="right")
+        by_pause = np.append(pauses, n)[following]
+        nxt = np.minimum(nxt, by_pause)
+
+    # Every line holds at least one word, even a single word over the limits
+    jump = np.maximum(nxt, indices + 1).tolist()
+
+    boundaries = [0]
+    position = 0
+    while position < n:
+        position = jump[position]
+        boundaries.append(position)
+    return np.asarray(boundaries, dtype=np.int64)
+
+
+def resegment_words(words: Sequence[Dict[str, Any]], max_chars: int = 42,
+                    max_duration: float = 6.0, max_pause: Optional[float] = 0.7) -> List[Dict[str, Any]]:
+    """
+    Regroup word timestamps into new segments
+
+    Args:
+        words: Word dicts with "word", "start" and "end" as returned by verbose_json
+        max_chars: Maximum characters per segment
+        max_duration: Maximum segment duration in seconds
+        max_pause: Pause in seconds that always starts a new segment (None to ignore pauses)
+
+    Returns:
+        List of segment dicts with start, end and text
+    """
+    n = len(words)
+    if n == 0:
+        return []
+
+    starts = np.fromiter((w["start"] for w in words), dtype=np.float64, count=n)
+    ends = np.fromiter((w["end"] for w in words), dtype=np.float64, count=n)
+    texts = [w["word"].strip() for w in words]
+
+    # Words from stitched chunks are already in order; sort only when needed
+    if n > 1 and np.any(starts[1:] < starts[:-1]):
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        texts = [texts[i] for i in order.tolist()]
+
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=n)
+    boundaries = line_breaks(starts, ends, lengths, max_chars, max_duration, max_pause)
+
+    line_ends = np.maximum.accumulate(ends)
+    first = boundaries[:-1]
+    last = boundaries[1:] - 1
+    segment_starts = starts[first].tolist()
+    segment_ends = line_ends[last].tolist()
+
+    return [
+        {"start": start, "end": end, "text": " ".join(texts[i:j])}
+        for start, end, i, j in zip(segment_starts, segment_ends, first.tolist(), boundaries[1:].tolist())
+    ]
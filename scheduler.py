@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Shortest-job-first scheduling with per-client fair shares.
+
+Transcriptions are no longer served in arrival order. Each request's cost is
+its audio duration, and whenever a transcription slot frees up, the next
+request is chosen in three steps:
+
+1. A request that has waited longer than STARVATION_SECONDS goes first
+   (oldest first), so long jobs cannot be postponed forever.
+2. Otherwise only clients with the fewest transcriptions already running are
+   considered, so one client's burst cannot take every slot.
+3. Among those, the cheapest request wins, oldest first on ties.
+
+The same policy (pick_next) orders in-process transcriptions through
+FairScheduler and worker claims in the job queue. Queue waits are recorded
+per priority class (short / medium / long audio).
+"""
+
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+# Transcriptions running at once in one process (the job queue is limited by its workers instead)
+MAX_CONCURRENT = int(os.getenv("GROQ_MAX_CONCURRENT_TRANSCRIPTIONS", "2"))
+
+# Requests waiting longer than this are served before any shorter job
+STARVATION_SECONDS = float(os.getenv("GROQ_STARVATION_SECONDS", "600"))
+
+# Priority classes by audio duration: short below 5 minutes, long from 30 minutes
+PRIORITY_CLASSES = (("short", 300.0), ("medium", 1800.0), ("long", float("inf")))
+
+# Cost of files whose duration is unknown, from their size at a typical 128 kbps
+FALLBACK_BYTES_PER_SECOND = 16000
+
+# Waits kept per class for the statistics
+RECENT_WAITS = 1000
+
+ANONYMOUS_CLIENT = "anonymous"
+
+# Set by the frontends (Gradio session, MCP client) before a transcription is requested
+current_client = contextvars.ContextVar("current_client", default=ANONYMOUS_CLIENT)
+
+
+def estimate_cost(probe: Dict[str, Any]) -> float:
+    """Expected seconds of audio to transcribe, from an audio_probe.probe_audio() result"""
+    if probe.get("duration"):
+        return float(probe["duration"])
+    return probe.get("size", 0) / FALLBACK_BYTES_PER_SECOND
+
+
+def priority_class(cost: float) -> str:
+    for name, limit in PRIORITY_CLASSES:
+        if cost < limit:
+            return name
+    return PRIORITY_CLASSES[-1][0]
+
+
+def pick_next(waiting: Sequence[Dict[str, Any]], running: Dict[str, int], now: float) -> Optional[int]:
+    """
+    Index of the request to serve next
+
+    Args:
+        waiting: Requests with "cost", "client" and "enqueued_at"
+        running: Number of running transcriptions per client
+        now: Current time
+
+    Returns:
+        Index into waiting, or None if nothing is waiting
+    """
+    if not waiting:
+        return None
+
+    starved = [i for i, request in enumerate(waiting) if now - request["enqueued_at"] >= STARVATION_SECONDS]
+    if starved:
+        return min(starved, key=lambda i: waiting[i]["enqueued_at"])
+
+    fewest = min(running.get(request["client"], 0) for request in waiting)
+    eligible = [i for i, request in enumerate(waiting) if running.get(request["client"], 0) == fewest]
+    return min(eligible, key=lambda i: (waiting[i]["cost"], waiting[i]["enqueued_at"]))
+
+
+def wait_summary(waits: Sequence[float]) -> Dict[str, Any]:
+    """Count and distribution of queue waits in seconds"""
+    if not len(waits):
+        return {"served": 0, "mean": None, "p50": None, "p95": None, "max": None}
+    values = np.asarray(waits, dtype=np.float64)
+    return {
+        "served": len(values),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+class FairScheduler:
+    """Grants a limited number of transcription slots in pick_next() order"""
+
+    def __init__(self, slots: int = MAX_CONCURRENT):
+        self.slots = slots
+        self.condition = threading.Condition()
+        self.waiting: List[Dict[str, Any]] = []
+        self.running: Dict[str, int] = {}
+        self.waits = {name: deque(maxlen=RECENT_WAITS) for name, _ in PRIORITY_CLASSES}
+
+    def _granted(self, request: Dict[str, Any]) -> bool:
+        if sum(self.running.values()) >= self.slots:
+            return False
+        index = pick_next(self.waiting, self.running, time.time())
+        return index is not None and self.waiting[index] is request
+
+    @contextmanager
+    def slot(self, cost: float, client: Optional[str] = None):
+        """Wait for this request's turn, then hold a transcription slot for the with block"""
+        client = client or current_client.get()
+        request = {"cost": cost, "client": client, "enqueued_at": time.time()}
+        with self.condition:
+            self.waiting.append(request)
+            try:
+                # Re-check periodically: a request can become starved without any slot being released
+                while not self._granted(request):
+                    self.condition.wait(timeout=1.0)
+            finally:
+                self.waiting.remove(request)
+            self.running[client] = self.running.get(client, 0) + 1
+            self.waits[priority_class(cost)].append(time.time() - request["enqueued_at"])
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.running[client] -= 1
+                if not self.running[client]:
+                    del self.running[client]
+                self.condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue wait statistics and current queue length per priority class"""
+        with self.condition:
+            classes = {}
+            for name, _ in PRIORITY_CLASSES:
+                summary = wait_summary(self.waits[name])
+                summary["waiting"] = sum(1 for request in self.waiting if priority_class(request["cost"]) == name)
+                classes[name] = summary
+            return {"slots": self.slots, "running": sum(self.running.values()), "classes": classes}
+
+
+scheduler = FairScheduler()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Unit tests for the header probes, on minimal synthesized files (no fixtures or ffmpeg needed)"""
+
+import struct
+import numpy as np
+import pytest
+from audio_probe import SNIFF_BYTES, AudioProbeError, preflight_audio, probe_audio, sniff_format
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def id3(size=100):
+    """Empty ID3v2 tag whose padding makes it `size` bytes long"""
+    body = size - 10
+    syncsafe = bytes([(body >> 21) & 0x7F, (body >> 14) & 0x7F, (body >> 7) & 0x7F, body & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(body)
+
+
+def wav(seconds, sample_rate=16000):
+    data = bytes(int(seconds * sample_rate) * 2)
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(data)) + data
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks
+
+
+def mp3(frames):
+    """MPEG-1 Layer III frames at 128 kbps and 44.1 kHz: 417 bytes and 1152 samples each"""
+    return (b"\xff\xfb\x90\x00" + bytes(413)) * frames
+
+
+def box(box_type, *children):
+    body = b"".join(children)
+    return struct.pack(">I", 8 + len(body)) + box_type + body
+
+
+def mp4(seconds, codec=b"mp4a"):
+    mvhd = box(b"mvhd", bytes(12), struct.pack(">II", 1000, int(seconds * 1000)), bytes(80))
+    hdlr = box(b"hdlr", bytes(8), b"soun", bytes(12))
+    stsd = box(b"stsd", bytes(4), struct.pack(">I", 1), box(codec, bytes(28)))
+    trak = box(b"trak", box(b"mdia", hdlr, box(b"minf", box(b"stbl", stsd))))
+    # The moov box after the media data, as written by most encoders
+    return box(b"ftyp", b"M4A ", bytes(4)) + box(b"mdat", bytes(1000)) + box(b"moov", mvhd, trak)
+
+
+def ebml(element_id, *children):
+    body = b"".join(children)
+    return element_id + b"\x01" + len(body).to_bytes(7, "big") + body
+
+
+def webm(seconds):
+    info = ebml(b"\x15\x49\xa9\x66", ebml(b"\x2a\xd7\xb1", (1000000).to_bytes(3, "big")),
+                ebml(b"\x44\x89", struct.pack(">d", seconds * 1000)))
+    tracks = ebml(b"\x16\x54\xae\x6b", ebml(b"\xae", ebml(b"\x86", b"A_OPUS")))
+    cluster = ebml(b"\x1f\x43\xb6\x75", bytes(100))
+    # Live recordings leave the Segment size unknown
+    segment = b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff" + info + tracks + cluster
+    return ebml(b"\x1a\x45\xdf\xa3", ebml(b"\x42\x82", b"webm")) + segment
+
+
+def ogg_page(packet, granule=0):
+    lacing = bytes([255] * (len(packet) // 255) + [len(packet) % 255])
+    return b"OggS\x00\x02" + struct.pack("<qII", granule, 1, 0) + bytes(4) + bytes([len(lacing)]) + lacing + packet
+
+
+def ogg(first_packet, granule):
+    return ogg_page(first_packet) + ogg_page(bytes(2000)) + ogg_page(bytes(100), granule)
+
+
+def streaminfo(sample_rate, total_samples):
+    bits = (sample_rate << 44) | (1 << 41) | (15 << 36) | total_samples
+    return bytes(10) + bits.to_bytes(8, "big") + bytes(16)
+
+
+def flac(sample_rate, total_samples):
+    return b"fLaC" + b"\x80\x00\x00\x22" + streaminfo(sample_rate, total_samples) + bytes(1000)
+
+
+def png():
+    ihdr = struct.pack(">IIBBBBB", 640, 480, 8, 6, 0, 0, 0)
+    noise = np.random.default_rng(0).integers(0, 256, 8000, dtype=np.uint8).tobytes()
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + bytes(4) + noise
+
+
+PROBE_CASES = [
+    ("a.wav", wav(2.5), "wav", "pcm_s16le", 2.5),
+    ("a.mp3", mp3(100), "mp3", "mp3", 100 * 1152 / 44100),
+    ("tagged.mp3", id3() + mp3(100), "mp3", "mp3", 100 * 1152 / 44100),
+    ("a.m4a", mp4(2.5), "mp4", "aac", 2.5),
+    ("a.webm", webm(2.5), "webm", "opus", 2.5),
+    ("opus.ogg", ogg(b"OpusHead\x01\x01" + struct.pack("<HI", 312, 48000) + bytes(3), 48000 * 7 + 312),
+     "ogg", "opus", 7.0),
+    ("vorbis.ogg", ogg(b"\x01vorbis" + struct.pack("<IBI", 0, 1, 44100) + bytes(14), 44100 * 7), "ogg", "vorbis", 7.0),
+    ("flac.ogg", ogg(b"\x7fFLAC\x01\x00\x00\x00fLaC\x80\x00\x00\x22" + streaminfo(44100, 44100 * 7), 44100 * 7),
+     "ogg", "flac", 7.0),
+    ("a.flac", flac(44100, 44100 * 7), "flac", "flac", 7.0),
+    ("tagged.flac", id3() + flac(44100, 44100 * 7), "flac", "flac", 7.0),
+]
+
+
+@pytest.mark.parametrize("name, data, fmt, codec, duration", PROBE_CASES, ids=[case[0] for case in PROBE_CASES])
+def test_probe_reads_format_codec_and_duration(tmp_path, name, data, fmt, codec, duration):
+    info = probe_audio(write(tmp_path, name, data))
+    assert (info["format"], info["codec"]) == (fmt, codec)
+    assert info["duration"] == pytest.approx(duration, rel=0.01)
+
+
+def test_sniff_accepts_mp3_behind_a_tag_larger_than_the_header():
+    assert sniff_format(id3(SNIFF_BYTES * 4)[:SNIFF_BYTES]) == "mp3"
+
+
+@pytest.mark.parametrize("data", [
+    png(),
+    np.random.default_rng(1).integers(0, 256, SNIFF_BYTES, dtype=np.uint8).tobytes(),
+    # One valid frame header in the middle of other data
+    bytes(100) + mp3(1) + bytes(SNIFF_BYTES),
+    # A valid first frame that is not followed by another
+    mp3(1) + b"\xff\x00" * SNIFF_BYTES,
+    # An ID3 tag in front of something that is not MPEG audio
+    id3() + png(),
+], ids=["png", "random", "stray-frame", "single-frame", "tagged-png"])
+def test_sniff_rejects_data_that_is_not_audio(data):
+    assert sniff_format(data[:SNIFF_BYTES]) is None
+
+
+def test_sniff_rejects_random_data():
+    rng = np.random.default_rng(2)
+    buffers = (rng.integers(0, 256, SNIFF_BYTES, dtype=np.uint8).tobytes() for _ in range(2000))
+    assert sum(sniff_format(buffer) is not None for buffer in buffers) == 0
+
+
+def test_preflight_rejects_unsupported_empty_and_long_inputs(tmp_path):
+    with pytest.raises(AudioProbeError, match="Unsupported"):
+        preflight_audio(write(tmp_path, "logo.png", png()))
+    with pytest.raises(AudioProbeError, match="empty"):
+        preflight_audio(write(tmp_path, "empty.mp3", b""))
+    with pytest.raises(AudioProbeError, match="second limit"):
+        preflight_audio(write(tmp_path, "long.wav", wav(3)), max_duration=2)
+    with pytest.raises(AudioProbeError, match="upload limit"):
+        preflight_audio(write(tmp_path, "big.wav", wav(3)), max_bytes=1000)
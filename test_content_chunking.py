@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Unit tests for content-defined chunking and the chunk store (no ffmpeg or API needed)"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from content_chunking import (
+    FRAME_SECONDS, SAMPLE_RATE, ChunkStore, pcm_features, plan_cuts, params_key,
+)
+
+SPEECH_DB = -20.0
+PAUSE_DB = -60.0
+
+
+def envelope_with_pauses(seconds, pauses):
+    """Loudness envelope of `seconds` of speech with (start, length) pauses, in seconds"""
+    envelope = np.full(int(seconds / FRAME_SECONDS), SPEECH_DB, dtype=np.float32)
+    for start, length in pauses:
+        envelope[int(start / FRAME_SECONDS):int((start + length) / FRAME_SECONDS)] = PAUSE_DB
+    return envelope
+
+
+def bursts(seconds, seed):
+    """Gain per sample of bursts of sound between pauses, like speech"""
+    rng = np.random.default_rng(seed)
+    gain = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    position = 0
+    while position < len(gain):
+        length = int(rng.uniform(0.5, 4.0) * SAMPLE_RATE)
+        gain[position:position + length] = rng.uniform(0.05, 0.3)
+        position += length + int(rng.uniform(0.3, 1.5) * SAMPLE_RATE)
+    return gain
+
+
+def to_pcm(signal):
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def noise(seconds, seed=0):
+    return np.random.default_rng(seed).normal(0, 1, int(seconds * SAMPLE_RATE)).astype(np.float32)
+
+
+def chord(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    # Same mean power as unit-variance noise
+    return (np.sin(2 * np.pi * 220 * t) + np.sin(2 * np.pi * 330 * t)).astype(np.float32)
+
+
+def whole(features):
+    return 0, len(features[0])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkStore(str(tmp_path / "store"))
+
+
+def test_plan_cuts_covers_envelope_and_cuts_at_pauses():
+    envelope = envelope_with_pauses(600, [(100, 1.0), (250, 2.0), (420, 1.5)])
+    cuts = plan_cuts(envelope, min_seconds=60, max_seconds=300)
+
+    assert cuts[0][0] == 0 and cuts[-1][1] == len(envelope)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(cuts, cuts[1:]))
+    assert all(end - start <= 300 / FRAME_SECONDS for start, end in cuts)
+    for _, end in cuts[:-1]:
+        assert envelope[end] == PAUSE_DB
+
+
+def test_plan_cuts_keeps_cuts_away_from_an_edit():
+    pauses = [(100, 1.0), (250, 2.0), (420, 1.5), (560, 1.0)]
+    envelope = envelope_with_pauses(700, pauses)
+    trimmed = envelope[int(30 / FRAME_SECONDS):]
+    shift = int(30 / FRAME_SECONDS)
+
+    original = {end for _, end in plan_cuts(envelope, min_seconds=60, max_seconds=300)[:-1]}
+    edited = {end + shift for _, end in plan_cuts(trimmed, min_seconds=60, max_seconds=300)[:-1]}
+    assert original == edited
+
+
+def test_plan_cuts_splits_evenly_without_pauses():
+    envelope = envelope_with_pauses(1000, [])
+    cuts = plan_cuts(envelope, min_seconds=60, max_seconds=300)
+    lengths = [end - start for start, end in cuts]
+    assert len(cuts) == 4 and max(lengths) - min(lengths) <= 1
+
+
+def test_identify_matches_the_same_audio_after_a_small_gain_change(store):
+    signal = noise(120) * bursts(120, seed=1)
+    features = pcm_features(to_pcm(signal))
+    quieter = pcm_features(to_pcm(signal * 0.9))
+
+    chunk_id = store.identify(features, *whole(features))
+    assert not chunk_id.startswith("exact-")
+    assert store.identify(quieter, *whole(quieter)) == chunk_id
+
+
+def test_identify_survives_reloading_the_index(store):
+    features = pcm_features(to_pcm(noise(90) * bursts(90, seed=2)))
+    chunk_id = store.identify(features, *whole(features))
+    assert ChunkStore(store.root).identify(features, *whole(features)) == chunk_id
+
+
+def test_identify_tells_apart_same_loudness_with_different_sound(store):
+    gain = bursts(120, seed=3)
+    hiss = pcm_features(to_pcm(noise(120) * gain))
+    tones = pcm_features(to_pcm(chord(120) * gain))
+
+    assert store.identify(hiss, *whole(hiss)) != store.identify(tones, *whole(tones))
+
+
+def test_identify_tells_apart_different_speech_of_the_same_length(store):
+    first = pcm_features(to_pcm(noise(120) * bursts(120, seed=4)))
+    second = pcm_features(to_pcm(noise(120) * bursts(120, seed=5)))
+    assert store.identify(first, *whole(first)) != store.identify(second, *whole(second))
+
+
+def test_identify_matches_steady_audio_only_exactly(store):
+    hiss = pcm_features(to_pcm(noise(200) * 0.1))
+    other_hiss = pcm_features(to_pcm(noise(200, seed=1) * 0.1))
+    tones = pcm_features(to_pcm(chord(200) * 0.1))
+    silence = pcm_features(to_pcm(np.zeros(200 * SAMPLE_RATE)))
+
+    ids = [store.identify(features, *whole(features)) for features in (hiss, other_hiss, tones, silence)]
+    assert all(chunk_id.startswith("exact-") for chunk_id in ids)
+    assert len(set(ids)) == len(ids)
+    # The same samples, e.g. when resuming, still match
+    assert store.identify(hiss, *whole(hiss)) == ids[0]
+    # Steady chunks are never registered for fuzzy matching
+    assert store.entries == []
+
+
+def test_identify_ignores_entries_indexed_without_a_spectral_shape(store):
+    features = pcm_features(to_pcm(noise(60) * bursts(60, seed=6)))
+    chunk_id = store.identify(features, *whole(features))
+    with open(store.index_path, "r") as f:
+        entry = json.loads(f.readline())
+    del entry["shape"]
+    with open(store.index_path, "w") as f:
+        f.write(json.dumps(entry) + "\n")
+
+    assert ChunkStore(store.root).entries == []
+
+
+def segment(start, end, avg_logprob=-0.2, no_speech_prob=0.01, text="hello"):
+    return {"start": start, "end": end, "text": text, "avg_logprob": avg_logprob, "no_speech_prob": no_speech_prob}
+
+
+def result(avg_logprob, language="english"):
+    return {"text": "hello", "language": language, "duration": 10.0,
+            "segments": [segment(0.0, 10.0, avg_logprob)]}
+
+
+def test_concurrent_saves_of_one_result_do_not_collide(store):
+    params = store.register_params("whisper", {})
+
+    def save(attempt):
+        store.save_result("chunk", params, result(-0.1 - attempt / 1000))
+
+    for _ in range(20):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(save, range(8)))
+    assert store.load_result("chunk", params)["segments"][0]["avg_logprob"] <= -0.1
+    directory = os.path.join(store.root, "results", params)
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+    # Results get the same permissions as any other new file, so a shared store stays readable
+    with open(os.path.join(directory, "plain"), "w"):
+        pass
+    assert os.stat(store._result_path("chunk", params)).st_mode == os.stat(os.path.join(directory, "plain")).st_mode
+
+
+def test_lookup_prefers_the_result_for_the_same_parameters(store):
+    own = store.register_params("whisper", {"language": "en"})
+    other = store.register_params("whisper", {"prompt": "names"})
+    store.save_result("chunk", own, result(-0.5))
+    store.save_result("chunk", other, result(-0.1))
+
+    found, other_params = store.lookup("chunk", own, store.reusable_params("whisper", {"language": "en"}))
+    assert found["segments"][0]["avg_logprob"] == -0.5 and not other_params
+
+
+def test_lookup_reuses_the_most_confident_result_of_other_parameters(store):
+    store.save_result("chunk", store.register_params("whisper", {"prompt": "a"}), result(-0.6))
+    store.save_result("chunk", store.register_params("whisper", {"prompt": "b"}), result(-0.2))
+    own = store.register_params("whisper", {"prompt": "c"})
+
+    found, other_params = store.lookup("chunk", own, store.reusable_params("whisper", {"prompt": "c"}))
+    assert found["segments"][0]["avg_logprob"] == -0.2 and other_params
+
+
+def test_lookup_skips_low_confidence_and_other_models(store):
+    store.save_result("chunk", store.register_params("whisper", {"prompt": "a"}), result(-1.5))
+    store.save_result("chunk", store.register_params("distil", {}), result(-0.1))
+    own = store.register_params("whisper", {})
+
+    assert store.lookup("chunk", own, store.reusable_params("whisper", {})) == (None, False)
+    assert store.lookup("missing", own, store.reusable_params("whisper", {})) == (None, False)
+    assert params_key("whisper", {}) == own
+
+
+def test_lookup_reuses_only_results_in_the_requested_language(store):
+    store.save_result("chunk", store.register_params("whisper", {}), result(-0.1, language="english"))
+    store.save_result("chunk", store.register_params("whisper", {"language": "de"}), result(-0.3, language="German"))
+
+    for language, expected in (("es", None), ("en", "english"), ("english", "english"), ("de", "German")):
+        own = store.register_params("whisper", {"language": language})
+        found, _ = store.lookup("chunk", own, store.reusable_params("whisper", {"language": language}), language)
+        assert (found and found["language"]) == expected
+
+
+def test_lookup_without_a_language_skips_results_forced_to_one(store):
+    store.save_result("chunk", store.register_params("whisper", {"language": "de"}), result(-0.1, language="German"))
+    own = store.register_params("whisper", {"prompt": "names"})
+    reusable = store.reusable_params("whisper", {"prompt": "names"})
+    assert store.lookup("chunk", own, reusable) == (None, False)
+
+    store.save_result("chunk", store.register_params("whisper", {}), result(-0.3, language="english"))
+    found, other_params = store.lookup("chunk", own, store.reusable_params("whisper", {"prompt": "names"}))
+    assert found["language"] == "english" and other_params
+
+
+def test_concurrent_first_runs_register_their_parameters(store):
+    prompts = [f"prompt {attempt}" for attempt in range(30)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for prompt in prompts:
+            keys = set(pool.map(lambda _: store.register_params("whisper", {"prompt": prompt}), range(8)))
+            assert keys == {params_key("whisper", {"prompt": prompt})}
+    assert len(store.reusable_params("whisper", {})) == len(prompts)
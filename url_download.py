@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Pooled, parallel and cached downloads of remote audio.
+
+All downloads share one requests session, so connections to the same host
+are kept alive and reused across calls. The first request asks for the first
+byte range only: a server that supports ranges answers with the total size,
+and the rest of the object is then fetched in parallel ranges written
+straight to their place in the file. Servers without range support are read
+in one stream.
+
+Downloaded files are kept in a local cache together with their ETag and
+Last-Modified validators. The next download of the same URL sends them as
+If-None-Match / If-Modified-Since, and a 304 answer reuses the cached file
+without transferring the audio again. Each request gets its own hard link to
+the cached file, so evicting the entry cannot remove a file still in use, and
+downloads of the same URL run one at a time so they never overwrite each
+other's copy.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from audio_probe import FORMAT_EXTENSIONS, SNIFF_BYTES, AudioProbeError, check_upload_size, sniff_format
+
+# Size of each byte range fetched in parallel
+PART_BYTES = int(float(os.getenv("GROQ_DOWNLOAD_PART_MB", "8")) * 1024 * 1024)
+
+# Ranges fetched at the same time for one download
+DOWNLOAD_WORKERS = int(os.getenv("GROQ_DOWNLOAD_WORKERS", "4"))
+
+DOWNLOAD_CACHE_DIR = os.getenv("GROQ_DOWNLOAD_CACHE_DIR", os.path.join("transcripts", ".downloads"))
+
+# Least recently used downloads are evicted beyond this total size
+DOWNLOAD_CACHE_BYTES = int(float(os.getenv("GROQ_DOWNLOAD_CACHE_MB", "2048")) * 1024 * 1024)
+
+STREAM_BLOCK_BYTES = 64 * 1024
+TIMEOUT_SECONDS = (10, 60)
+
+_session = None
+_session_lock = threading.Lock()
+
+# One lock per cache key, dropped once no download of that URL holds it
+_key_locks = weakref.WeakValueDictionary()
+_key_locks_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """The shared session, with a connection pool large enough for parallel ranges"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(10, DOWNLOAD_WORKERS * 4))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def key_lock(url: str) -> threading.Lock:
+    """Lock held while a URL is downloaded, so concurrent requests for it take turns"""
+    with _key_locks_lock:
+        lock = _key_locks.get(cache_key(url))
+        if lock is None:
+            lock = _key_locks[cache_key(url)] = threading.Lock()
+        return lock
+
+
+def _total_size(response: requests.Response) -> Optional[int]:
+    """Full object size from a 206 Content-Range header ("bytes 0-99/1234")"""
+    total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _write_blocks(blocks, file, max_bytes: Optional[int], written: int = 0) -> int:
+    """Write downloaded blocks to a file, stopping at the size limit; returns the bytes written"""
+    for block in blocks:
+        written += len(block)
+        if max_bytes is not None:
+            check_upload_size(written, max_bytes)
+        file.write(block)
+    return written
+
+
+def _fetch_range(url: str, path: str, start: int, end: int, validator: Optional[str]) -> None:
+    """Download bytes [start, end] into the same positions of an existing file"""
+    headers = {"Range": f"bytes={start}-{end}"}
+    if validator:
+        # The server sends the whole (new) object instead if it changed since the first range
+        headers["If-Range"] = validator
+    with get_session().get(url, headers=headers, stream=True, timeout=TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError(f"Remote file changed during download: {url}")
+        with open(path, "r+b") as f:
+            f.seek(start)
+            written = _write_blocks(response.iter_content(chunk_size=STREAM_BLOCK_BYTES), f, None)
+    if written != end - start + 1:
+        raise IOError(f"Incomplete range {start}-{end} of {url}")
+
+
+class DownloadCache:
+    """Downloaded files and their HTTP validators, one pair of files per URL"""
+
+    def __init__(self, root: str = DOWNLOAD_CACHE_DIR, max_bytes: int = DOWNLOAD_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Cached entry for a URL, or None when there is none or its file is gone"""
+        try:
+            with open(self._meta_path(cache_key(url)), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url and os.path.exists(entry["path"]) else None
+
+    def checkout(self, path: str, audio_format: str) -> Optional[str]:
+        """
+        Private path to a cached file for one request, which the caller deletes when done.
+        A hard link shares the data without copying it and keeps it readable after the
+        entry is evicted. Returns None when the file is already gone.
+        """
+        request_path = os.path.join(self.root, f"request-{uuid.uuid4().hex}{FORMAT_EXTENSIONS[audio_format]}")
+        try:
+            os.link(path, request_path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # File systems without hard links get a copy
+            try:
+                shutil.copyfile(path, request_path)
+            except FileNotFoundError:
+                return None
+        return request_path
+
+    def touch(self, url: str) -> None:
+        try:
+            os.utime(self._meta_path(cache_key(url)))
+        except OSError:
+            pass
+
+    def store(self, url: str, temp_path: str, audio_format: str, size: int,
+              etag: Optional[str], last_modified: Optional[str]) -> str:
+        """Move a finished download into the cache and record its validators"""
+        key = cache_key(url)
+        path = os.path.join(self.root, key + FORMAT_EXTENSIONS[audio_format])
+        os.replace(temp_path, path)
+        entry = {"url": url, "path": path, "format": audio_format, "size": size,
+                 "etag": etag, "last_modified": last_modified}
+        meta_path = self._meta_path(key)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self.evict(keep=meta_path)
+        return path
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove least recently used downloads until the cache fits its size limit"""
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json") or os.path.join(self.root, name) == keep:
+                continue
+            meta_path = os.path.join(self.root, name)
+            try:
+                with open(meta_path, "r") as f:
+                    entry = json.load(f)
+                entries.append((os.path.getmtime(meta_path), meta_path, entry))
+            except (OSError, ValueError):
+                continue
+        total = sum(entry["size"] for _, _, entry in entries)
+        if keep:
+            with open(keep, "r") as f:
+                total += json.load(f)["size"]
+        for _, meta_path, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            for path in (meta_path, entry["path"]):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            total -= entry["size"]
+
+
+def download_audio(url: str, max_bytes: Optional[int] = None,
+                   cache: Optional[DownloadCache] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Download remote audio, reusing the cached copy when the server reports it unchanged
+
+    Args:
+        url: HTTP(S) URL of the audio file
+        max_bytes: Largest accepted size, checked before and while downloading
+        cache: Download cache (default: one in DOWNLOAD_CACHE_DIR)
+
+    Returns:
+        (local path, info) where info holds the sniffed "format", "size", whether the
+        file came from the "cached" copy and the number of "parts" fetched. The file
+        belongs to this call and the caller must delete it.
+    """
+    cache = cache or DownloadCache()
+    # A second request for the URL waits, then revalidates the copy the first one cached
+    with key_lock(url):
+        return _download(url, max_bytes, cache, cache.lookup(url))
+
+
+def _download(url: str, max_bytes: Optional[int], cache: DownloadCache,
+              cached: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    headers = {"Range": f"bytes=0-{PART_BYTES - 1}"}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = get_session().get(url, headers=headers, stream=True, timeout=TIMEOUT_SECONDS)
+    try:
+        if response.status_code == 304 and cached:
+            if max_bytes is not None:
+                check_upload_size(cached["size"], max_bytes)
+            path = cache.checkout(cached["path"], cached["format"])
+            if path is None:
+                # Evicted since the lookup: download it again
+                return _download(url, max_bytes, cache, None)
+            cache.touch(url)
+            return path, {"format": cached["format"], "size": cached["size"], "cached": True, "parts": 0}
+        response.raise_for_status()
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        ranged = response.status_code == 206 and _total_size(response) is not None
+        size = _total_size(response) if ranged else response.headers.get("Content-Length")
+        if size is not None and max_bytes is not None:
+            # Reject oversized files before downloading the body when the server reports a size
+            check_upload_size(int(size), max_bytes)
+
+        # Detect the real format from the first bytes rather than trusting the URL
+        blocks = response.iter_content(chunk_size=STREAM_BLOCK_BYTES)
+        head = b""
+        for block in blocks:
+            head += block
+            if len(head) >= SNIFF_BYTES:
+                break
+        audio_format = sniff_format(head[:SNIFF_BYTES])
+        if audio_format is None:
+            raise AudioProbeError("Unsupported or unrecognised audio format")
+
+        fd, temp_path = tempfile.mkstemp(suffix=FORMAT_EXTENSIONS[audio_format] + ".part", dir=cache.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(head)
+                written = _write_blocks(blocks, f, max_bytes, len(head))
+                if ranged:
+                    size = int(size)
+                    f.truncate(size)
+
+            parts = 1
+            if ranged and size > written:
+                # Weak ETags cannot be used with If-Range
+                validator = etag if etag and not etag.startswith("W/") else last_modified
+                ranges = [(start, min(start + PART_BYTES, size) - 1) for start in range(written, size, PART_BYTES)]
+                parts += len(ranges)
+                with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+                    futures = [executor.submit(_fetch_range, url, temp_path, start, end, validator)
+                               for start, end in ranges]
+                    for future in futures:
+                        future.result()
+            size = size if ranged else written
+
+            info = {"format": audio_format, "size": size, "cached": False, "parts": parts}
+            if etag or last_modified:
+                # Take this request's link before the file joins the cache and can be evicted
+                path = cache.checkout(temp_path, audio_format)
+                cache.store(url, temp_path, audio_format, size, etag, last_modified)
+                return path, info
+            return temp_path, info
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+    finally:
+        response.close()
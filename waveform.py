@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Precomputed waveform peaks for displaying long recordings.
+
+Browsers decode the whole file to draw a waveform, which makes multi-hour
+uploads sluggish. Instead the server decodes the audio once with ffmpeg,
+reduces it with NumPy to a fixed number of min/max peak pairs and caches
+them by content hash, so the page only receives a small SVG.
+"""
+
+import os
+import subprocess
+from typing import Any, Dict
+import numpy as np
+from chunked_transcription import file_digest
+
+# Decoding rate for peaks; enough to show the envelope, cheap to decode
+PEAK_SAMPLE_RATE = 8000
+
+# Min/max are first taken over 10 ms blocks, then reduced to PEAK_BINS pairs
+BLOCK_SAMPLES = 80
+PEAK_BINS = 2000
+
+PEAKS_DIR = os.getenv("GROQ_PEAKS_DIR", os.path.join("transcripts", ".peaks"))
+
+
+def decode_peaks(path: str, bins: int = PEAK_BINS) -> Dict[str, Any]:
+    """
+    Decode a file and reduce it to `bins` min/max pairs, reading the PCM in blocks
+
+    Returns:
+        Dictionary with "min" and "max" int16 arrays (one value per bin) and "duration"
+    """
+    process = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+         "-vn", "-ac", "1", "-ar", str(PEAK_SAMPLE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    read_bytes = BLOCK_SAMPLES * 2 * 4000
+    mins, maxs, leftover = [], [], b""
+    samples_read = 0
+    while True:
+        data = process.stdout.read(read_bytes)
+        if not data:
+            break
+        data = leftover + data
+        usable = len(data) - len(data) % (BLOCK_SAMPLES * 2)
+        leftover = data[usable:]
+        blocks = np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, BLOCK_SAMPLES)
+        mins.append(blocks.min(axis=1))
+        maxs.append(blocks.max(axis=1))
+        samples_read += usable // 2
+    if len(leftover) >= 2:
+        tail = np.frombuffer(leftover[:len(leftover) - len(leftover) % 2], dtype=np.int16)
+        mins.append(tail.min(keepdims=True))
+        maxs.append(tail.max(keepdims=True))
+        samples_read += len(tail)
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg could not decode audio: {stderr.decode(errors='replace').strip()}")
+
+    block_min = np.concatenate(mins) if mins else np.zeros(1, dtype=np.int16)
+    block_max = np.concatenate(maxs) if maxs else np.zeros(1, dtype=np.int16)
+
+    # Min/max of min/max blocks: group the blocks into at most `bins` bins
+    edges = np.unique(np.linspace(0, len(block_min), min(bins, len(block_min)) + 1).astype(np.int64)[:-1])
+    return {
+        "min": np.minimum.reduceat(block_min, edges),
+        "max": np.maximum.reduceat(block_max, edges),
+        "duration": samples_read / PEAK_SAMPLE_RATE,
+    }
+
+
+def load_peaks(path: str, bins: int = PEAK_BINS, cache_dir: str = PEAKS_DIR) -> Dict[str, Any]:
+    """Peaks of a file, computed once per content hash and read from the cache afterwards"""
+    cache_path = os.path.join(cache_dir, f"{file_digest(path)}_{bins}.npz")
+    try:
+        with np.load(cache_path) as cached:
+            return {"min": cached["min"], "max": cached["max"], "duration": float(cached["duration"])}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    peaks = decode_peaks(path, bins)
+    os.makedirs(cache_dir, exist_ok=True)
+    # np.savez adds .npz to names without it, so the temporary name keeps the suffix
+    temp_path = cache_path[:-len(".npz")] + ".tmp.npz"
+    np.savez(temp_path, min=peaks["min"], max=peaks["max"], duration=peaks["duration"])
+    os.replace(temp_path, cache_path)
+    return peaks
+
+
+def peaks_svg(peaks: Dict[str, Any], width: int = 1000, height: int = 80,
+              color: str = "#f97316") -> str:
+    """Render peaks as one SVG path of vertical min-to-max bars"""
+    count = len(peaks["min"])
+    if count == 0:
+        return ""
+    middle = height / 2
+    x = np.arange(count) * (width / count)
+    top = middle - peaks["max"].astype(np.float64) / 32768 * middle
+    bottom = middle - peaks["min"].astype(np.float64) / 32768 * middle
+    # Keep silent stretches visible as a thin line
+    bottom = np.maximum(bottom, top + 0.5)
+    commands = "".join(f"M{a:.1f} {b:.1f}V{c:.1f}" for a, b, c in zip(x.tolist(), top.tolist(), bottom.tolist()))
+    return (
+        f'<svg viewBox="0 0 {width} {height}" preserveAspectRatio="none" width="100%" height="{height}">'
+        f'<path d="{commands}" stroke="{color}" stroke-width="{max(width / count, 0.5):.2f}" fill="none"/>'
+        f'</svg>'
+    )
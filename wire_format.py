@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Compact columnar wire format for transcription results.
+
+The default MCP result repeats "start", "end", "text" and a "formatted_time"
+string for every segment, and word timestamps would add one object per word.
+The columnar format sends each field as one parallel array instead. Times are
+quantized to integer milliseconds and sent as the difference from the previous
+start plus a duration, which keeps the numbers short. Words can be included as
+columns too at a fraction of the row format's size.
+
+    {
+      "format": "columnar-v1",
+      "time_scale": 1000,
+      "segments": {"start_delta": [...], "duration": [...], "text": [...]},
+      "words": {"start_delta": [...], "duration": [...], "word": [...]}
+    }
+
+MCP results in this format carry these columns under "columns" and leave out
+the full "text" when it is just the segment texts joined (see joined_text()). decode_columns()
+and expand_result() turn them back into the row format.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+COLUMNAR_FORMAT = "columnar-v1"
+
+# Timestamps are sent in units of 1 / TIME_SCALE seconds
+TIME_SCALE = 1000
+
+RESULT_FORMATS = ("json", "columnar")
+
+
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as MM:SS.ss"""
+    return f"{int(seconds//60):02d}:{seconds%60:05.2f}"
+
+
+def format_time_range(start: float, end: float) -> str:
+    """[MM:SS.ss - MM:SS.ss], as shown next to each segment"""
+    return f"[{format_timestamp(start)} - {format_timestamp(end)}]"
+
+
+def joined_text(segments: Sequence[Dict[str, Any]]) -> str:
+    """Full text rebuilt from the segments, as decoders of results without "text" do"""
+    return " ".join(segment["text"].strip() for segment in segments)
+
+
+def _encode_times(items: Sequence[Dict[str, Any]], time_scale: int) -> Dict[str, List[int]]:
+    n = len(items)
+    starts = np.rint(np.fromiter((item["start"] for item in items), dtype=np.float64, count=n) * time_scale)
+    ends = np.rint(np.fromiter((item["end"] for item in items), dtype=np.float64, count=n) * time_scale)
+    # Quantize first and take differences of the integers, so decoding never accumulates rounding errors
+    starts = starts.astype(np.int64)
+    return {
+        "start_delta": np.diff(starts, prepend=0).tolist(),
+        "duration": (ends.astype(np.int64) - starts).tolist(),
+    }
+
+
+def _decode_times(columns: Dict[str, List[int]], time_scale: int):
+    starts = np.cumsum(np.asarray(columns["start_delta"], dtype=np.int64))
+    ends = starts + np.asarray(columns["duration"], dtype=np.int64)
+    return (starts / time_scale).tolist(), (ends / time_scale).tolist()
+
+
+def encode_columns(segments: Sequence[Dict[str, Any]], words: Optional[Sequence[Dict[str, Any]]] = None,
+                   time_scale: int = TIME_SCALE) -> Dict[str, Any]:
+    """
+    Encode segments (and optionally words) as parallel arrays
+
+    Args:
+        segments: Segment dicts with "start", "end" and "text"
+        words: Word dicts with "start", "end" and "word", or None to leave words out
+        time_scale: Timestamp units per second
+
+    Returns:
+        Columnar dict as described in the module docstring
+    """
+    columns = {
+        "format": COLUMNAR_FORMAT,
+        "time_scale": time_scale,
+        "segments": {**_encode_times(segments, time_scale), "text": [segment["text"].strip() for segment in segments]},
+    }
+    if words is not None:
+        columns["words"] = {**_encode_times(words, time_scale), "word": [word["word"] for word in words]}
+    return columns
+
+
+def decode_columns(columns: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Decode columnar data back to row dicts
+
+    Returns:
+        Dictionary with "segments" (start, end, text, formatted_time) and, when
+        the columns include them, "words" (word, start, end)
+    """
+    if columns.get("format") != COLUMNAR_FORMAT:
+        raise ValueError(f"Unsupported wire format: {columns.get('format')!r}")
+    time_scale = columns["time_scale"]
+
+    starts, ends = _decode_times(columns["segments"], time_scale)
+    decoded = {
+        "segments": [
+            {"start": start, "end": end, "text": text, "formatted_time": format_time_range(start, end)}
+            for start, end, text in zip(starts, ends, columns["segments"]["text"])
+        ]
+    }
+    if "words" in columns:
+        starts, ends = _decode_times(columns["words"], time_scale)
+        decoded["words"] = [
+            {"word": word, "start": start, "end": end}
+            for start, end, word in zip(starts, ends, columns["words"]["word"])
+        ]
+    return decoded
+
+
+def expand_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Row-format copy of a columnar MCP result; other results are returned as they are"""
+    if "columns" not in result:
+        return result
+    expanded = {key: value for key, value in result.items() if key != "columns"}
+    expanded.update(decode_columns(result["columns"]))
+    if "text" not in expanded:
+        # Columnar results leave out the full text when the segments contain it
+        expanded["text"] = joined_text(expanded["segments"])
+    return expanded
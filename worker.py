@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Transcription workers for the job queue (job_queue.py).
+
+Each worker process claims one job at a time, keeps its visibility timeout
+extended while transcribing, and stores the result or the error. Start more
+workers, here or on other terminals sharing the same GROQ_JOB_DB, to raise
+throughput; the frontends need GROQ_JOB_QUEUE=1 to send their work here.
+
+Usage:
+    python worker.py                # one worker
+    python worker.py --workers 4    # four worker processes
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+from typing import Optional
+from dotenv import load_dotenv
+from api_client import create_client, start_warm_pool
+from audio_probe import AudioProbeError
+from job_queue import JOB_DB_PATH, VISIBILITY_TIMEOUT_SECONDS, JobQueue, handle_job
+from profiling import profile_request
+
+IDLE_SLEEP_SECONDS = 0.5
+
+
+def keep_claimed(queue: JobQueue, job, stop: threading.Event) -> None:
+    """Extend the job's visibility timeout until stop is set or the lease is lost"""
+    while not stop.wait(VISIBILITY_TIMEOUT_SECONDS / 3):
+        if not queue.extend(job["id"], job["lease"]):
+            return
+
+
+def run_worker(db_path: str = JOB_DB_PATH, max_jobs: Optional[int] = None) -> None:
+    """Claim and run jobs until interrupted (or max_jobs have been handled)"""
+    load_dotenv()
+    client = create_client()
+    # A worker transcribes one chunk at a time: keep one connection warm between jobs
+    stop_warm = start_warm_pool(client, 1)
+    queue = JobQueue(db_path)
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    handled = 0
+
+    print(f"👷 Worker {name} waiting for jobs in {db_path}")
+    while max_jobs is None or handled < max_jobs:
+        job = queue.claim(name)
+        if job is None:
+            time.sleep(IDLE_SLEEP_SECONDS)
+            continue
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=keep_claimed, args=(queue, job, stop), daemon=True)
+        heartbeat.start()
+        started = time.time()
+        try:
+            # The frontends only wait for queued jobs, so the work is profiled here
+            with profile_request(f"job_{job['kind']}"):
+                result = handle_job(client, job)
+        except AudioProbeError as e:
+            # Bad input fails the same way on every attempt
+            queue.fail(job["id"], job["lease"], str(e), retry=False)
+            print(f"❌ Job {job['id']} rejected: {e}")
+        except Exception as e:
+            queue.fail(job["id"], job["lease"], str(e))
+            print(f"⚠️  Job {job['id']} attempt {job['attempts']} failed: {e}")
+        else:
+            if queue.complete(job["id"], job["lease"], result):
+                print(f"✅ Job {job['id']} done in {time.time() - started:.1f}s")
+            else:
+                print(f"↩️  Job {job['id']} finished after it was cancelled or its lease moved to another worker; "
+                      f"result dropped")
+        finally:
+            stop.set()
+            heartbeat.join()
+        handled += 1
+    stop_warm.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run transcription workers for the job queue")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument("--db", default=JOB_DB_PATH, help=f"Job database (default: {JOB_DB_PATH})")
+    args = parser.parse_args(argv)
+
+    if args.workers == 1:
+        run_worker(args.db)
+        return 0
+
+    processes = [multiprocessing.Process(target=run_worker, args=(args.db,)) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(0)